@@ -0,0 +1,58 @@
+import numpy as np
+
+from .SimpleCalibration import SimpleCalibration
+from ..LightSkin import LightSkin
+
+
+class AdaptiveCalibration(SimpleCalibration):
+    """ A SimpleCalibration that follows slow drift of the sensor values, e.g. with temperature.
+
+        After the initial calibration, every `update` moves the expected values of unloaded rays towards the
+        given frame with an exponential moving average. A ray counts as unloaded if its relative deviation
+        from the expected value, |log(value / expected)|, is below `threshold`; pressed areas are left alone.
+
+        Drift updates do not increase `version`: solvers keep their system matrices and selected rays
+        and only pick up the new expected values when building the b side for the next frame.
+    """
+
+    _MIN_VALUE = 0.000001
+    """ Lower bound of the sensor values, so the logarithm stays finite """
+
+    def __init__(self, ls: LightSkin, frames: int = 1, rate: float = 0.01, threshold: float = 0.05):
+        super().__init__(ls, frames)
+        self.rate: float = rate
+        """ Weight of a new frame in the moving average """
+        self.threshold: float = threshold
+        """ Maximal deviation in log space for a ray to be considered unloaded """
+        self.driftUpdates: int = 0
+        """ Number of frames used to track the drift since the last calibration """
+        self.raysUpdated: int = 0
+        """ Number of rays considered unloaded in the last update """
+
+    def update(self, values: np.ndarray = None):
+        """ Track the drift with the given frame, indexed by [led][sensor]; defaults to the current frame
+            of the skins default forward model. Until the calibration is complete, the frame is added to it. """
+        if values is None:
+            values = self.ls.forwardModel.getAllSensorValues()
+        if not self.isCalibrated:
+            self.addFrame(values)
+            return
+
+        values = np.maximum(np.asarray(values, dtype=float), self._MIN_VALUE)
+        log_values = np.log(values)
+        unloaded = np.abs(log_values - self._logCalibration) < self.threshold
+
+        calibration = np.where(unloaded, self._calibration + self.rate * (values - self._calibration),
+                               self._calibration)
+        calibration.flags.writeable = False
+        with np.errstate(divide='ignore'):
+            log_calibration = np.log(calibration)
+        log_calibration.flags.writeable = False
+
+        self._calibration, self._logCalibration = calibration, log_calibration
+        self.driftUpdates += 1
+        self.raysUpdated = int(np.count_nonzero(unloaded))
+
+    def _apply(self):
+        super()._apply()
+        self.driftUpdates = 0
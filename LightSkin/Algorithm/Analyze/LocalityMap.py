@@ -3,6 +3,9 @@ from abc import abstractmethod
 from collections import namedtuple
 from typing import List, Tuple, NamedTuple
 
+import numpy as np
+
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...Helpers.ValueMap import ValueMap
 from ...LightSkin import LightSkin
@@ -43,29 +46,27 @@ class LocalityMap(ValueMap):
 
     def calculate(self) -> bool:
         """ Calculate the sensitivity values for the grid elements using the model info """
-        self.grid = self.gridDefinition.makeGridFilledWith(0.0)
         self.localityGrid = self.gridDefinition.makeGridFilledWith(Locality(0, 0, 0))
 
-        m = 0.0
-        """ Maximum value """
+        matrix = InfluenceMatrix.forModel(self.ls, self.rayModel)
+        A = matrix.A.tocoo()
 
-        for i_l, l in enumerate(self.ls.LEDs):
-            for i_s, s in enumerate(self.ls.sensors):
-                ray = self.ls.getRayFromLEDToSensor(i_s, i_l)
-                cells = self.rayModel.getInfluencesForRay(ray)
+        # only count cells that are not too close to the LED or sensor of the ray
+        x = matrix.cellX[A.col]
+        y = matrix.cellY[A.col]
+        l = matrix.ledPositions[matrix.rayLED[A.row]]
+        s = matrix.sensorPositions[matrix.raySensor[A.row]]
+        distance = np.minimum(np.hypot(x - l[:, 0], y - l[:, 1]), np.hypot(x - s[:, 0], y - s[:, 1]))
+        relevant = distance > self.min_sensor_distance
 
-                for ((x, y), w) in cells:
-                    if min(
-                            self.gridDefinition.distanceToCell(x, y, l),
-                            self.gridDefinition.distanceToCell(x, y, s)
-                    ) > self.min_sensor_distance:
-                        self.grid[x][y] += w
-                        m = max(m, self.grid[x][y])
+        values = np.bincount(A.col[relevant], A.data[relevant], minlength=matrix.shape[1])
 
         # scale everything by max
+        m = values.max(initial=0.0)
+        """ Maximum value """
         if m > 0:
-            for x in range(self.gridDefinition.cellsX):
-                for y in range(self.gridDefinition.cellsY):
-                    self.grid[x][y] /= m
+            values /= m
+
+        self.grid = matrix.toGrid(values)
 
         return True
@@ -1,6 +1,9 @@
 import math
 from abc import abstractmethod
 
+import numpy as np
+
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...Helpers.ValueMap import ValueMap
 from ...LightSkin import LightSkin
@@ -20,32 +23,33 @@ class SensitivityMap(ValueMap):
 
     def calculate(self, onlySelected=True) -> bool:
         """ Calculate the sensitivity values for the grid elements using the model info """
-        self.grid = self.gridDefinition.makeGridFilledWith(0.0)
-
-        m = 0.0
-        """ Maximum value """
-
-        for i_l, l in enumerate(self.ls.LEDs):
-            if self.ls.selectedLED >= 0 and self.ls.selectedLED != i_l:
-                continue
-            for i_s, s in enumerate(self.ls.sensors):
-                if self.ls.selectedSensor >= 0 and self.ls.selectedSensor != i_s:
-                    continue
-                ray = self.ls.getRayFromLEDToSensor(i_s, i_l)
-                cells = self.rayModel.getInfluencesForRay(ray)
-
-                for ((x, y), w) in cells:
-                    if min(
-                            self.gridDefinition.distanceToCell(x, y, l),
-                            self.gridDefinition.distanceToCell(x, y, s)
-                    ) > self.min_sensor_distance:
-                        self.grid[x][y] += w
-                        m = max(m, self.grid[x][y])
+        matrix = InfluenceMatrix.forModel(self.ls, self.rayModel)
+        A = matrix.A.tocoo()
+
+        selected = np.ones(A.nnz, dtype=bool)
+        if self.ls.selectedLED >= 0:
+            selected &= matrix.rayLED[A.row] == self.ls.selectedLED
+        if self.ls.selectedSensor >= 0:
+            selected &= matrix.raySensor[A.row] == self.ls.selectedSensor
+        rays = A.row[selected]
+        cols = A.col[selected]
+
+        # only count cells that are not too close to the LED or sensor of the ray
+        x = matrix.cellX[cols]
+        y = matrix.cellY[cols]
+        l = matrix.ledPositions[matrix.rayLED[rays]]
+        s = matrix.sensorPositions[matrix.raySensor[rays]]
+        distance = np.minimum(np.hypot(x - l[:, 0], y - l[:, 1]), np.hypot(x - s[:, 0], y - s[:, 1]))
+        relevant = distance > self.min_sensor_distance
+
+        values = np.bincount(cols[relevant], A.data[selected][relevant], minlength=matrix.shape[1])
 
         # scale everything by max
+        m = values.max(initial=0.0)
+        """ Maximum value """
         if m > 0:
-            for x in range(self.gridDefinition.cellsX):
-                for y in range(self.gridDefinition.cellsY):
-                    self.grid[x][y] /= m
+            values /= m
+
+        self.grid = matrix.toGrid(values)
 
         return True
@@ -1,28 +1,48 @@
 import math
 
 import re
+import struct
+import time
 from threading import Thread
+from typing import Optional, Tuple
 
+import numpy as np
 import serial
-from ...LightSkin import ForwardModel, LightSkin, EventHook
 
+from .StreamingForwardModel import StreamingForwardModel
+from ...LightSkin import LightSkin
 
-class ArduinoConnectorForwardModel(ForwardModel):
+
+class ArduinoConnectorForwardModel(StreamingForwardModel):
     """ Connects to an Arduino running the Arduino Connector Script on the given port with the given baudrate
         Parses the input in a new thread and updates its values accordingly.
-        After each full received frame, the onUpdate is triggered. """
+        After each full received frame, the onUpdate is triggered; the last frames are available in `frames`.
+
+        Two frame formats are understood and can be mixed in one stream:
+         * Text: a line `Snapshot: <leds>,<sensors>` followed by one line of comma separated values per LED
+         * Binary: `BINARY_MAGIC`, the number of LEDs and sensors as little endian uint16,
+           one little endian uint16 value per LED and sensor (LED by LED)
+           and the sum of these values modulo 2^16 as little endian uint16 checksum
+    """
 
     sampleDistance = 0.125
     MAX_VALUE = 1024
+    BINARY_MAGIC = b'\xffLS\xfe'
+    _BINARY_HEADER = struct.Struct('<4sHH')
+    _TEXT_HEADER = b'Snapshot: '
+    _MAX_BUFFER = 1 << 20
+    """ Unparseable data beyond this size is dropped """
 
-    def __init__(self, ls: LightSkin, port: str, baudrate: int):
-        super().__init__(ls)
+    def __init__(self, ls: LightSkin, port: str, baudrate: int, verbose: bool = True, history: int = None):
+        super().__init__(ls, history)
 
-        self.onUpdate: EventHook = EventHook()
-
-        self._sensorValues = []
-        for i in range(len(self.ls.LEDs)):
-            self._sensorValues.append([1.0] * len(self.ls.sensors))
+        self.verbose: bool = verbose
+        """ Print a message for every received frame """
+        self.framesReceived: int = 0
+        self.checksumErrors: int = 0
+        self.parseTime: float = 0.0
+        """ Total seconds spent on parsing frames (excluding the onUpdate handlers) """
+        self._buffer = bytearray()
 
         self._readerThread = Thread(target=self._readLoop, daemon=True)
         self._readerThreadRun = False
@@ -49,33 +69,134 @@ class ArduinoConnectorForwardModel(ForwardModel):
     def _readLoop(self):
         print('Read Loop started')
         while self._readerThreadRun:
-            line = self.ser.readline()
-            match = re.match(b'Snapshot: ([0-9]+),([0-9]+)', line)
-            if match is not None:
-                leds = int(match.group(1))
-                sensors = int(match.group(2))
-                if leds != len(self.ls.LEDs) or sensors != len(self.ls.sensors):
-                    print("Received wring amount of sensor values: %i / %i; expected %i / %i" % (
-                    leds, sensors, len(self.ls.LEDs), len(self.ls.sensors)))
-                else:
-                    try:
-                        for l in range(leds):
-                            line = self.ser.readline()
-                            vals = line.split(b',')
-                            for s in range(sensors):
-                                val = float(vals[s]) / self.MAX_VALUE if s < len(vals) else 0.0
-                                self._sensorValues[l][s] = min(1.0, max(0.0, val))
-                        print("received data")
-                        self.onUpdate()
-                    except Exception as e:
-                        print(e)
+            # read everything available at once; block for at least one byte
+            try:
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except serial.SerialException as e:
+                print("Connection lost: %s" % e)
+                break
+            if len(data) > 0:
+                self._buffer += data
+                self._parseBuffer()
         print('Read Loop finished')
 
-    def measureLEDAtPoint(self, x: float, y: float, led: int = -1) -> float:
-        # No measurement possible
-        return 0.0
+    def _parseBuffer(self):
+        """ Parses and applies all complete frames in the receive buffer """
+        buf = self._buffer
+        pos = 0
+        while True:
+            text_pos = buf.find(self._TEXT_HEADER, pos)
+            binary_pos = buf.find(self.BINARY_MAGIC, pos)
+            if text_pos < 0 and binary_pos < 0:
+                # keep what could be the start of a header
+                pos = max(pos, len(buf) - len(self._TEXT_HEADER) + 1)
+                break
+            t = time.perf_counter()
+            if binary_pos >= 0 and (text_pos < 0 or binary_pos < text_pos):
+                end, frame = self._parseBinaryFrame(binary_pos)
+            else:
+                end, frame = self._parseTextFrame(text_pos)
+            self.parseTime += time.perf_counter() - t
+            if end is None:
+                # frame not complete yet
+                pos = min(p for p in (text_pos, binary_pos) if p >= 0)
+                break
+            pos = end
+            if frame is not None:
+                self._applyFrame(frame)
+
+        del buf[:pos]
+        if len(buf) > self._MAX_BUFFER:
+            del buf[:len(buf) - self._MAX_BUFFER]
+
+    def _checkSize(self, leds: int, sensors: int) -> bool:
+        if leds != len(self.ls.LEDs) or sensors != len(self.ls.sensors):
+            print("Received wring amount of sensor values: %i / %i; expected %i / %i" % (
+                leds, sensors, len(self.ls.LEDs), len(self.ls.sensors)))
+            return False
+        return True
+
+    def _parseBinaryFrame(self, start: int) -> Tuple[Optional[int], Optional[np.ndarray]]:
+        """ Parses the binary frame at the given position of the buffer.
+            Returns the position after the frame (None if the frame is not complete yet) and the frame if valid """
+        buf = self._buffer
+        header_end = start + self._BINARY_HEADER.size
+        if len(buf) < header_end:
+            return None, None
+        _, leds, sensors = self._BINARY_HEADER.unpack_from(buf, start)
+        if not self._checkSize(leds, sensors):
+            return header_end, None
+        end = header_end + 2 * leds * sensors + 2
+        if len(buf) < end:
+            return None, None
+
+        values = np.frombuffer(buf, dtype='<u2', count=leds * sensors, offset=header_end)
+        checksum = int.from_bytes(buf[end - 2:end], 'little')
+        if int(values.sum(dtype=np.uint64)) & 0xffff != checksum:
+            self.checksumErrors += 1
+            print("Received frame with wrong checksum")
+            # the magic might have been part of other data; search again right after it
+            return start + 1, None
+
+        return end, values.reshape(leds, sensors) / self.MAX_VALUE
+
+    def _parseTextFrame(self, start: int) -> Tuple[Optional[int], Optional[np.ndarray]]:
+        """ Parses the text frame at the given position of the buffer.
+            Returns the position after the frame (None if the frame is not complete yet) and the frame if valid """
+        buf = self._buffer
+        line_end = buf.find(b'\n', start)
+        if line_end < 0:
+            return None, None
+        match = re.match(b'Snapshot: ([0-9]+),([0-9]+)', buf[start:line_end])
+        if match is None:
+            return line_end + 1, None
+        leds = int(match.group(1))
+        sensors = int(match.group(2))
+        if not self._checkSize(leds, sensors):
+            return line_end + 1, None
+
+        lines = []
+        for l in range(leds):
+            next_end = buf.find(b'\n', line_end + 1)
+            if next_end < 0:
+                return None, None
+            lines.append(bytes(buf[line_end + 1:next_end]))
+            line_end = next_end
+
+        try:
+            frame = self._newFrame(0.0)
+            for l, line in enumerate(lines):
+                vals = line.strip().split(b',')[:sensors]
+                frame[l, :len(vals)] = np.array(vals, dtype=float)
+            return line_end + 1, frame / self.MAX_VALUE
+        except Exception as e:
+            print(e)
+            return line_end + 1, None
+
+    def _applyFrame(self, frame: np.ndarray):
+        """ Makes the given frame the current one and triggers onUpdate """
+        np.clip(frame, 0.0, 1.0, out=frame)
+        self.framesReceived += 1
+        if self.verbose:
+            print("received data")
+        self._publishFrame(frame)
+
+    @classmethod
+    def encodeBinaryFrame(cls, values: np.ndarray) -> bytes:
+        """ Encodes raw sensor values (0 to MAX_VALUE; indexed by [led][sensor]) as binary frame """
+        values = np.asarray(values, dtype='<u2')
+        leds, sensors = values.shape
+        checksum = int(values.sum(dtype=np.uint64)) & 0xffff
+        return cls._BINARY_HEADER.pack(cls.BINARY_MAGIC, leds, sensors) + values.tobytes() \
+            + checksum.to_bytes(2, 'little')
+
+    @classmethod
+    def encodeTextFrame(cls, values: np.ndarray) -> bytes:
+        """ Encodes raw sensor values (0 to MAX_VALUE; indexed by [led][sensor]) as text frame """
+        values = np.asarray(values, dtype=int)
+        lines = [b'Snapshot: %i,%i' % values.shape]
+        lines += [b','.join(b'%i' % v for v in row) for row in values.tolist()]
+        return b'\r\n'.join(lines) + b'\r\n'
 
-    def getSensorValue(self, sensor: int, led: int = -1) -> float:
-        if led < 0:
-            led = self.ls.selectedLED
-        return self._sensorValues[led][sensor]
+    def _newFrame(self, val: float) -> np.ndarray:
+        return np.full((len(self.ls.LEDs), len(self.ls.sensors)), val)
@@ -0,0 +1,99 @@
+import os
+import time
+import tty
+from threading import Thread
+from typing import Callable, List
+
+import numpy as np
+
+from .ArduinoConnectorForwardModel import ArduinoConnectorForwardModel
+from ...Helpers.FramePacer import FramePacer
+
+
+class FakeArduino:
+    """ A local stand-in for an Arduino running the Arduino Connector Script (Linux only).
+        Opens a pseudo terminal and writes frames to it at the given rate (frames per second) in a new thread,
+        so an ArduinoConnectorForwardModel can connect to `port` as if it was a real board.
+
+        The frame function gets the time in seconds since the start and returns the sensor values
+        (0.0 to 1.0, indexed by [led][sensor]); by default a fixed random pattern is sent.
+        Gaussian noise with the given standard deviation is added to every value.
+    """
+
+    def __init__(self, leds: int, sensors: int,
+                 rate: float = 100.0,
+                 noise: float = 0.0,
+                 binary: bool = False,
+                 frame_function: Callable[[float], np.ndarray] = None,
+                 seed: int = None,
+                 autostart: bool = True):
+        self.leds: int = leds
+        self.sensors: int = sensors
+        self.rate: float = rate
+        self.noise: float = noise
+        self.binary: bool = binary
+        """ Use the binary instead of the text protocol """
+        self._random = np.random.default_rng(seed)
+        self._pattern: np.ndarray = self._random.uniform(0.2, 0.9, (leds, sensors))
+        self.frameFunction: Callable[[float], np.ndarray] = frame_function or (lambda t: self._pattern)
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port: str = os.ttyname(self._slave)
+        """ The device to connect to """
+
+        self.sendTimes: List[float] = []
+        """ time.perf_counter() when writing each frame started """
+
+        self._writerThread: Thread = None
+        self._writerThreadRun = False
+        if autostart:
+            self.start()
+
+    def __del__(self):
+        self.close()
+
+    def start(self):
+        """ Start sending frames """
+        if self._writerThreadRun:
+            return
+        self._writerThreadRun = True
+        self._writerThread = Thread(target=self._writeLoop, daemon=True)
+        self._writerThread.start()
+
+    def stop(self):
+        """ Stop sending frames """
+        if self._writerThreadRun:
+            self._writerThreadRun = False
+            self._writerThread.join()
+
+    def close(self):
+        """ Stop sending frames and close the pseudo terminal """
+        self.stop()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _writeLoop(self):
+        pacer = FramePacer()
+        pacer.start()
+        while self._writerThreadRun:
+            data = self.encodeFrame(self.frameFunction(pacer.frameTime - pacer.startTime))
+            view = memoryview(data)
+            t = time.perf_counter()
+            while len(view) > 0:
+                view = view[os.write(self._master, view):]
+            self.sendTimes.append(t)
+            pacer.waitNext(self.rate)
+
+    def encodeFrame(self, values: np.ndarray) -> bytes:
+        """ Adds noise to the given values and encodes them in the protocol of the Arduino Connector Script """
+        values = np.asarray(values, dtype=float)
+        if self.noise > 0:
+            values = values + self._random.normal(0.0, self.noise, values.shape)
+        raw = np.rint(np.clip(values, 0.0, 1.0) * ArduinoConnectorForwardModel.MAX_VALUE)
+        if self.binary:
+            return ArduinoConnectorForwardModel.encodeBinaryFrame(raw)
+        return ArduinoConnectorForwardModel.encodeTextFrame(raw)
@@ -0,0 +1,135 @@
+import struct
+import time
+from threading import Lock
+from typing import List, Tuple
+
+import numpy as np
+
+from ...LightSkin import ForwardModel
+
+
+class FrameRecording:
+    """ A recording of frames in a file; memory-mapped, so even multi-hour recordings are not loaded into RAM.
+
+        File format (little endian):
+         * Header: `MAGIC`, format version (uint16), number of LEDs and sensors (uint32 each)
+         * LED and sensor coordinates (float64 x / y pairs)
+         * Zero padding up to a multiple of 8 bytes
+         * One record per frame: timestamp (float64, seconds since the epoch)
+           and the sensor values (float32, indexed by [led][sensor])
+    """
+
+    MAGIC = b'LSREC\x00'
+    VERSION = 1
+    _HEADER = struct.Struct('<6sHII')
+
+    def __init__(self, path: str):
+        """ Opens an existing recording; frames appended later are visible after `refresh` """
+        self.path: str = path
+        with open(path, 'rb') as f:
+            magic, version, leds, sensors = self._HEADER.unpack(f.read(self._HEADER.size))
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("%s is not a frame recording of version %i" % (path, self.VERSION))
+            coords = np.frombuffer(f.read(16 * (leds + sensors)), dtype='<f8').reshape(-1, 2)
+
+        self.LEDs: List[Tuple[float, float]] = [tuple(c) for c in coords[:leds].tolist()]
+        self.sensors: List[Tuple[float, float]] = [tuple(c) for c in coords[leds:].tolist()]
+        self.recordType: np.dtype = self.recordTypeFor(leds, sensors)
+        self._offset: int = self.headerSize(leds, sensors)
+        self._records: np.ndarray = None
+        self.refresh()
+
+    @classmethod
+    def recordTypeFor(cls, leds: int, sensors: int) -> np.dtype:
+        return np.dtype([('time', '<f8'), ('values', '<f4', (leds, sensors))])
+
+    @classmethod
+    def headerSize(cls, leds: int, sensors: int) -> int:
+        size = cls._HEADER.size + 16 * (leds + sensors)
+        return size + (-size) % 8
+
+    @classmethod
+    def header(cls, leds: List[Tuple[float, float]], sensors: List[Tuple[float, float]]) -> bytes:
+        """ Returns the header of a recording for the given geometry, including padding """
+        data = cls._HEADER.pack(cls.MAGIC, cls.VERSION, len(leds), len(sensors))
+        data += np.array(list(leds) + list(sensors), dtype='<f8').reshape(-1, 2).tobytes()
+        return data + bytes(cls.headerSize(len(leds), len(sensors)) - len(data))
+
+    def refresh(self):
+        """ Maps all complete frames currently in the file """
+        with open(self.path, 'rb') as f:
+            f.seek(0, 2)
+            count = (f.tell() - self._offset) // self.recordType.itemsize
+        self._records = np.memmap(self.path, dtype=self.recordType, mode='r', offset=self._offset, shape=(count,)) \
+            if count > 0 else np.zeros(0, dtype=self.recordType)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """ Returns the values of the given frame, indexed by [led][sensor] """
+        return self._records['values'][index]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """ Timestamps of all frames in seconds since the epoch """
+        return self._records['time']
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) > 0 else 0.0
+
+    def indexAtTime(self, t: float) -> int:
+        """ Returns the first frame at or after the given number of seconds since the start of the recording """
+        if len(self) == 0:
+            return 0
+        return int(np.searchsorted(self.timestamps, self.timestamps[0] + t, side='left'))
+
+
+class FrameRecorder:
+    """ Appends every frame of a forward model to a FrameRecording file; hooks the onUpdate of the forward model """
+
+    def __init__(self, forward_model: ForwardModel, path: str):
+        """ forward_model needs to provide an onUpdate EventHook, like the ArduinoConnectorForwardModel.
+            An existing file is overwritten. """
+        self.forwardModel: ForwardModel = forward_model
+        self.path: str = path
+        self.framesRecorded: int = 0
+        ls = forward_model.ls
+        self._recordType = FrameRecording.recordTypeFor(len(ls.LEDs), len(ls.sensors))
+        self._record = np.zeros(1, dtype=self._recordType)
+        self._lock = Lock()
+        self._file = open(path, 'wb')
+        self._file.write(FrameRecording.header(ls.LEDs, ls.sensors))
+        self.forwardModel.onUpdate += self._onUpdate
+
+    def __del__(self):
+        self.close()
+
+    def _onUpdate(self):
+        self.record(self.forwardModel.getAllSensorValues())
+
+    def record(self, values: np.ndarray, timestamp: float = None):
+        """ Appends the given frame; uses the current time if no timestamp is given """
+        with self._lock:
+            if self._file is None:
+                return
+            self._record['time'] = time.time() if timestamp is None else timestamp
+            self._record['values'] = values
+            self._file.write(self._record.tobytes())
+            self.framesRecorded += 1
+
+    def flush(self):
+        """ Makes all recorded frames visible to readers of the file """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """ Stops recording and closes the file """
+        with self._lock:
+            if self._file is None:
+                return
+            self.forwardModel.onUpdate -= self._onUpdate
+            self._file.close()
+            self._file = None
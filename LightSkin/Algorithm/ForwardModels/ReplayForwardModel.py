@@ -0,0 +1,149 @@
+import time
+from threading import Condition, Thread
+
+from .FrameRecording import FrameRecording
+from .StreamingForwardModel import StreamingForwardModel
+from ...LightSkin import LightSkin, EventHook
+
+
+class ReplayForwardModel(StreamingForwardModel):
+    """ Replays a FrameRecording in a new thread; after each frame the onUpdate is triggered,
+        just like the ArduinoConnectorForwardModel does.
+
+        Frames are served
+         * at a fixed rate (frames per second) if `rate` is given,
+         * as fast as possible if `speed` is None,
+         * otherwise with the recorded timing, sped up by `speed`.
+        In the as fast as possible mode every frame is handled by all onUpdate handlers before the next one is served.
+    """
+
+    def __init__(self, ls: LightSkin, path: str,
+                 speed: float = 1.0,
+                 rate: float = None,
+                 loop: bool = False,
+                 autostart: bool = True,
+                 history: int = None):
+        super().__init__(ls, history)
+
+        self.onFinished: EventHook = EventHook()
+        """ EventHook that gets triggered when the end of the recording is reached (and not looping) """
+
+        self.recording: FrameRecording = FrameRecording(path)
+        if len(self.recording.LEDs) != len(ls.LEDs) or len(self.recording.sensors) != len(ls.sensors):
+            raise ValueError("Recording has %i LEDs / %i sensors; expected %i / %i" % (
+                len(self.recording.LEDs), len(self.recording.sensors), len(ls.LEDs), len(ls.sensors)))
+
+        self.speed: float = speed
+        self.rate: float = rate
+        self.loop: bool = loop
+
+        self.frameIndex: int = -1
+        """ Index of the current frame in the recording """
+        self._nextIndex: int = 0
+        self._seeked: bool = False
+        """ Whether the position changed since the timing started """
+        self._showIndex: int = None
+        """ Frame to be shown by the replay thread next, requested by showFrame """
+        self._condition: Condition = Condition()
+        """ Guards the replay state; notified on seeking, showing a frame and stopping to end waits early """
+
+        self._replayThread: Thread = None
+        self._replayThreadRun = False
+        if autostart:
+            self.start()
+
+    def __del__(self):
+        self.stop()
+
+    def start(self):
+        """ Start or resume replaying at the current position """
+        with self._condition:
+            if self._replayThreadRun:
+                return
+            self._replayThreadRun = True
+            self._replayThread = Thread(target=self._replayLoop, daemon=True)
+            self._replayThread.start()
+
+    def stop(self):
+        """ Pause replaying """
+        with self._condition:
+            if not self._replayThreadRun:
+                return
+            self._replayThreadRun = False
+            self._condition.notify_all()
+        self._replayThread.join()
+
+    def seek(self, index: int):
+        """ Continue replaying at the given frame """
+        with self._condition:
+            self._nextIndex = max(0, min(len(self.recording), index))
+            self._seeked = True
+            self._condition.notify_all()
+
+    def seekTime(self, t: float):
+        """ Continue replaying at the given number of seconds since the start of the recording """
+        self.seek(self.recording.indexAtTime(t))
+
+    def showFrame(self, index: int):
+        """ Makes the given frame the current one and triggers onUpdate.
+            While replaying, this is done by the replay thread, as it is the only one writing frames. """
+        with self._condition:
+            if self._replayThreadRun:
+                self._showIndex = index
+                self._condition.notify_all()
+                return
+            self._showFrame(index)
+
+    def _showFrame(self, index: int):
+        self.frameIndex = index
+        self._publishFrame(self.recording[index])
+
+    def _replayLoop(self):
+        print('Replay Loop started')
+        timestamps = self.recording.timestamps
+        start_index = None
+        start_time = 0.0
+        finished = False
+        while True:
+            with self._condition:
+                if self._showIndex is not None:
+                    index, self._showIndex = self._showIndex, None
+                elif not self._replayThreadRun:
+                    break
+                else:
+                    index = self._nextIndex
+                    if index >= len(self.recording):
+                        self.recording.refresh()
+                        timestamps = self.recording.timestamps
+                        if index < len(self.recording):
+                            continue
+                        if not self.loop or len(self.recording) == 0:
+                            self._replayThreadRun = False
+                            finished = True
+                            break
+                        index = 0
+                        start_index = None
+
+                    if start_index is None or self._seeked:
+                        # (re-)start timing after seeking
+                        start_index = index
+                        start_time = time.perf_counter()
+                        self._seeked = False
+
+                    if self.rate is not None:
+                        due = start_time + (index - start_index) / self.rate
+                    elif self.speed is not None:
+                        due = start_time + (timestamps[index] - timestamps[start_index]) / self.speed
+                    else:
+                        due = 0.0
+                    wait = due - time.perf_counter()
+                    if wait > 0:
+                        # woken up early by seek(), showFrame() or stop(); then the state is checked again
+                        self._condition.wait(wait)
+                        continue
+                    self._nextIndex = index + 1
+
+            self._showFrame(index)
+        if finished:
+            self.onFinished()
+        print('Replay Loop finished')
@@ -1,5 +1,8 @@
 import math
 
+import numpy as np
+
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
 from ..RayInfluenceModels.RayInfluenceModel import Ray, RayGridInfluenceModel
 from ...LightSkin import ForwardModel, Calibration, LightSkin
 
@@ -35,6 +38,24 @@ class SimpleProportionalForwardModel(ForwardModel):
         #print("Calculated value for LED %i (%i, %i) to (%i, %i) Distance: %i; val: %f" % (led, LED[0], LED[1], x, y, dist, val))
         return max(0.0, min(1.0, val))
 
+    def getAllSensorValues(self) -> np.ndarray:
+        return self.calculateSensorValues(self.ls.translucencyMap.grid)
+
+    def calculateSensorValues(self, translucency) -> np.ndarray:
+        """ Returns the values of all sensors for all LEDs (indexed by [led][sensor])
+            for the given translucency grid (indexed by [i][j] like the translucency map of the skin) """
+        matrix = InfluenceMatrix.forModel(self.ls, self.rayModel)
+
+        # weighted factorization of all rays at once: prod(t ** w) = exp(sum(w * log(t)))
+        with np.errstate(divide='ignore'):
+            log_translucency = np.log(matrix.fromGrid(translucency))
+        translucencyMul = np.exp(matrix.A @ log_translucency)
+
+        val = 4 / np.maximum(matrix.rayLengths, 0.1)
+        val *= translucencyMul
+
+        return np.clip(val, 0.0, 1.0).reshape(matrix.ledCount, matrix.sensorCount)
+
 
 class SimpleIdealProportionalCalibration(Calibration):
     """ The ideal calibration values for the SimpleProportionalForwardModel """
@@ -42,6 +63,11 @@ class SimpleIdealProportionalCalibration(Calibration):
     def __hash__(self):
         return hash(self.__class__.__name__)  # all instances of this class are equivalent
 
+    @property
+    def version(self) -> int:
+        # the expected values only depend on the geometry
+        return self.ls.geometryVersion
+
     def expectedSensorValue(self, sensor: int, led: int) -> float:
         ray = self.ls.getRayFromLEDToSensor(sensor, led)
 
@@ -49,3 +75,10 @@ class SimpleIdealProportionalCalibration(Calibration):
         val = 4 / dist
 
         return max(0.0, min(1.0, val))
+
+    def expectedSensorValues(self) -> np.ndarray:
+        leds = np.array(self.ls.LEDs, dtype=float).reshape(-1, 2)
+        sensors = np.array(self.ls.sensors, dtype=float).reshape(-1, 2)
+        dist = np.hypot(sensors[np.newaxis, :, 0] - leds[:, np.newaxis, 0],
+                        sensors[np.newaxis, :, 1] - leds[:, np.newaxis, 1])
+        return np.clip(4 / np.maximum(dist, 0.1), 0.0, 1.0)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from ...Helpers.FrameRingBuffer import FrameRingBuffer
+from ...LightSkin import ForwardModel, LightSkin, EventHook
+
+
+class StreamingForwardModel(ForwardModel):
+    """ Base for forward models that receive or generate a stream of frames in their own thread.
+        The last frames are kept in a FrameRingBuffer; after each new frame the onUpdate is triggered. """
+
+    HISTORY = 64
+    """ Default number of frames kept """
+
+    def __init__(self, ls: LightSkin, history: int = None):
+        super().__init__(ls)
+
+        self.onUpdate: EventHook = EventHook()
+
+        self.frames: FrameRingBuffer = FrameRingBuffer((len(ls.LEDs), len(ls.sensors)), history or self.HISTORY)
+        """ The last frames with their timestamps (time.perf_counter()) and sequence numbers """
+        self._noFrame: np.ndarray = np.ones(self.frames.shape)
+        """ Served until the first frame arrives """
+        self._noFrame.flags.writeable = False
+
+    @property
+    def frameCount(self) -> int:
+        """ Number of frames since the start """
+        return self.frames.latestSequence + 1
+
+    @property
+    def frameTime(self) -> float:
+        """ time.perf_counter() when the current frame arrived; allows consumers to measure their latency """
+        t = self.frames.timestamp(self.frames.latestSequence)
+        return 0.0 if t is None else t
+
+    def _publishFrame(self, frame: np.ndarray, timestamp: float = None):
+        """ Makes the given frame the current one and triggers onUpdate """
+        self.frames.push(frame, timestamp)
+        self.onUpdate()
+
+    def measureLEDAtPoint(self, x: float, y: float, led: int = -1) -> float:
+        # No measurement possible
+        return 0.0
+
+    def getSensorValue(self, sensor: int, led: int = -1) -> float:
+        if led < 0:
+            led = self.ls.selectedLED
+        return float(self.getAllSensorValues()[led][sensor])
+
+    def getAllSensorValues(self) -> np.ndarray:
+        """ Returns a read-only view of the current frame without copying.
+            It stays unchanged until the ring buffer wraps around, `frames.capacity` frames later. """
+        frame = self.frames.latest()
+        return self._noFrame if frame is None else frame
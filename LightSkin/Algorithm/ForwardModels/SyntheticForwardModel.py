@@ -0,0 +1,98 @@
+import math
+from threading import Thread
+from typing import Callable
+
+import numpy as np
+
+from .SimpleProportionalForwardModel import SimpleProportionalForwardModel
+from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
+from .StreamingForwardModel import StreamingForwardModel
+from ...Helpers.FramePacer import FramePacer
+from ...LightSkin import LightSkin
+
+
+class SyntheticForwardModel(StreamingForwardModel):
+    """ Simulates a connected skin without any hardware:
+        Emits frames at the given rate (frames per second) in a new thread, calculated by the
+        SimpleProportionalForwardModel over a translucency map changing with time, with optional gaussian noise.
+        After each frame, the onUpdate is triggered, just like the ArduinoConnectorForwardModel does.
+
+        The translucency function gets the time in seconds since the start and returns a grid
+        on the translucency map of the skin, indexed by [i][j]. By default a pressure spot circles the skin.
+    """
+
+    def __init__(self, ls: LightSkin, ray_model: RayGridInfluenceModel,
+                 rate: float = 100.0,
+                 noise: float = 0.0,
+                 translucency_function: Callable[[float], np.ndarray] = None,
+                 seed: int = None,
+                 autostart: bool = True,
+                 history: int = None):
+        super().__init__(ls, history)
+
+        self.rate: float = rate
+        """ Frames per second """
+        self.noise: float = noise
+        """ Standard deviation of the noise added to every sensor value """
+        self.translucencyFunction: Callable[[float], np.ndarray] = translucency_function or self.movingSpot
+        self._simulation = SimpleProportionalForwardModel(ls, ray_model)
+        self._random = np.random.default_rng(seed)
+
+        self._pacer: FramePacer = FramePacer()
+        self._generatorThread: Thread = None
+        self._generatorThreadRun = False
+        if autostart:
+            self.start()
+
+    @property
+    def lateFrames(self) -> int:
+        """ Number of frames that could not be emitted in time, because calculating or handling them took too long """
+        return self._pacer.lateFrames
+
+    def __del__(self):
+        self.stop()
+
+    def start(self):
+        """ Start emitting frames """
+        if self._generatorThreadRun:
+            return
+        self._generatorThreadRun = True
+        self._generatorThread = Thread(target=self._generatorLoop, daemon=True)
+        self._generatorThread.start()
+
+    def stop(self):
+        """ Stop emitting frames; waits for the current frame to be handled """
+        if self._generatorThreadRun:
+            self._generatorThreadRun = False
+            self._generatorThread.join()
+
+    def _generatorLoop(self):
+        print('Generator Loop started')
+        self._pacer.start()
+        while self._generatorThreadRun:
+            self._publishFrame(self.calculateFrame(self._pacer.frameTime - self._pacer.startTime))
+            self._pacer.waitNext(self.rate)
+        print('Generator Loop finished')
+
+    def calculateFrame(self, t: float) -> np.ndarray:
+        """ Returns the frame at the given time in seconds since the start, including noise """
+        frame = self._simulation.calculateSensorValues(self.translucencyFunction(t))
+        if self.noise > 0:
+            frame += self._random.normal(0.0, self.noise, frame.shape)
+            np.clip(frame, 0.0, 1.0, out=frame)
+        return frame
+
+    def movingSpot(self, t: float, period: float = 2.0, radius: float = 1.5, depth: float = 0.5) -> np.ndarray:
+        """ The translucency map of the skin with a pressure spot moving in a circle once every period """
+        g = self._simulation.rayModel.gridDefinition
+        grid = np.array(self.ls.translucencyMap.grid, dtype=float)
+
+        angle = 2 * math.pi * t / period
+        center_x = g.startX + g.width / 2 + g.width / 4 * math.cos(angle)
+        center_y = g.startY + g.height / 2 + g.height / 4 * math.sin(angle)
+        x = g.startX + (np.arange(g.cellsX) + 0.5) * g.cellWidth
+        y = g.startY + (np.arange(g.cellsY) + 0.5) * g.cellHeight
+        distance = np.hypot(x[:, np.newaxis] - center_x, y[np.newaxis, :] - center_y)
+
+        grid *= 1 - depth * np.clip(1 - distance / radius, 0.0, 1.0)
+        return grid
@@ -1,9 +1,8 @@
-from functools import lru_cache
 from typing import Tuple, List, Dict
 
 import math
 
-from .RayInfluenceModel import RayGridInfluenceModel, Ray
+from .RayInfluenceModel import RayGridInfluenceModel, Ray, cachedInfluences
 
 
 class DirectSampledRayGridInfluenceModel(RayGridInfluenceModel):
@@ -14,7 +13,10 @@ class DirectSampledRayGridInfluenceModel(RayGridInfluenceModel):
 
     sampleDistance = 0.125
 
-    @lru_cache(maxsize=512)
+    def parameters(self) -> Tuple:
+        return self.sampleDistance,
+
+    @cachedInfluences
     def getInfluencesForRay(self, ray: Ray) -> List[Tuple[Tuple[int, int], float]]:
         dx = ray.dx
         dy = ray.dy
@@ -0,0 +1,61 @@
+from typing import Tuple, List
+
+import numpy as np
+
+from .RayInfluenceModel import RayGridInfluenceModel, Ray, cachedInfluences
+
+
+class ExactDirectRayGridInfluenceModel(RayGridInfluenceModel):
+    """
+        Calculates the weights of the grid cells as the exact length of the direct path of the ray within each cell.
+        Cells on the border extend 'infinitely', like in the DirectSampledRayGridInfluenceModel.
+
+        All rays are traversed at once (Siddon's method): the ray parameters of all crossings with the grid lines
+        are sorted per ray; each section between two crossings lies within exactly one cell.
+    """
+
+    @cachedInfluences
+    def getInfluencesForRay(self, ray: Ray) -> List[Tuple[Tuple[int, int], float]]:
+        _, cell_i, cell_j, weights = self.getInfluencesForRays([ray])
+        return list(zip(zip(cell_i.tolist(), cell_j.tolist()), weights.tolist()))
+
+    def getInfluencesForRays(self, rays: List[Ray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        g = self.gridDefinition
+        coords = np.array([(r.start_x, r.start_y, r.end_x, r.end_y) for r in rays], dtype=float).reshape(-1, 4)
+        start_x, start_y = coords[:, 0:1], coords[:, 1:2]
+        dx = coords[:, 2:3] - start_x
+        dy = coords[:, 3:4] - start_y
+        length = np.hypot(dx, dy)
+
+        # only the inner grid lines separate cells; the border cells extend infinitely
+        lines_x = g.startX + np.arange(1, g.cellsX) * g.cellWidth
+        lines_y = g.startY + np.arange(1, g.cellsY) * g.cellHeight
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            alpha = np.concatenate((
+                np.zeros_like(length),
+                (lines_x - start_x) / dx,
+                (lines_y - start_y) / dy,
+                np.ones_like(length)
+            ), axis=1)
+        # crossings outside of the ray (or parallel to it) are moved to the end, where they span no length
+        alpha[~((alpha >= 0) & (alpha <= 1))] = 1.0
+        alpha.sort(axis=1)
+
+        section_length = np.diff(alpha, axis=1) * length
+        mid = (alpha[:, 1:] + alpha[:, :-1]) / 2
+        cell_i = np.clip(np.floor((start_x + mid * dx - g.startX) / g.cellWidth), 0, g.cellsX - 1).astype(np.intp)
+        cell_j = np.clip(np.floor((start_y + mid * dy - g.startY) / g.cellHeight), 0, g.cellsY - 1).astype(np.intp)
+        ray_ind = np.broadcast_to(np.arange(len(coords))[:, np.newaxis], section_length.shape)
+
+        used = section_length > 0
+        ray_ind, cell_i, cell_j, section_length = ray_ind[used], cell_i[used], cell_j[used], section_length[used]
+
+        # sections of one ray in the same cell are merged, so no cell is listed twice
+        cells = (ray_ind * g.cellsY + cell_j) * g.cellsX + cell_i
+        cells, inverse = np.unique(cells, return_inverse=True)
+        weights = np.bincount(inverse, section_length, minlength=len(cells))
+        ray_cell, cell_i = np.divmod(cells, g.cellsX)
+        ray_ind, cell_j = np.divmod(ray_cell, g.cellsY)
+
+        return ray_ind, cell_i, cell_j, weights
@@ -0,0 +1,160 @@
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sparse
+
+from .RayInfluenceModel import RayGridInfluenceModel, Ray
+from ...Helpers.DiskCache import DiskCache
+from ...Helpers.Grids import ValueGridDefinition
+from ...LightSkin import LightSkin
+
+
+class InfluenceMatrix:
+    """ The influences of all grid cells on all LED -> sensor rays of a skin as one sparse matrix.
+
+        Rows are rays, ordered LED by LED: `row = led * sensorCount + sensor`.
+        Columns are cells, ordered row by row of the grid: `col = j * cellsX + i`.
+    """
+
+    MAX_CACHED = 8
+    """ Number of matrices kept alive by `forModel` """
+    _cache: Dict[Tuple, 'InfluenceMatrix'] = {}
+    _cacheLock: Lock = Lock()
+    """ Guards `_cache`; held while building, so threads asking for the same matrix build it only once """
+    diskCache: DiskCache = None
+    """ If set, matrices are loaded from / stored in this cache instead of being rebuilt in every process """
+
+    def __init__(self, ls: LightSkin, ray_model: RayGridInfluenceModel):
+        """ Builds the matrix for the current geometry of the skin and the grid of the given ray model """
+        self.key: Tuple = self.keyFor(ls, ray_model)
+        """ Identifies the geometry, grid and ray model this matrix was built for """
+        self.gridDefinition: ValueGridDefinition = ray_model.gridDefinition
+        self.ledCount: int = len(ls.LEDs)
+        self.sensorCount: int = len(ls.sensors)
+
+        self.ledPositions: np.ndarray = np.array(ls.LEDs, dtype=float).reshape(-1, 2)
+        self.sensorPositions: np.ndarray = np.array(ls.sensors, dtype=float).reshape(-1, 2)
+
+        m = self.ledCount * self.sensorCount
+        n = self.gridDefinition.cellsX * self.gridDefinition.cellsY
+
+        self.rayLED, self.raySensor = np.divmod(np.arange(m), self.sensorCount)
+        """ LED and sensor index of every row """
+        self.cellJ, self.cellI = np.divmod(np.arange(n), self.gridDefinition.cellsX)
+        """ Cell coordinates of every column """
+        self.cellX: np.ndarray = self.gridDefinition.startX + (self.cellI + 0.5) * self.gridDefinition.cellWidth
+        self.cellY: np.ndarray = self.gridDefinition.startY + (self.cellJ + 0.5) * self.gridDefinition.cellHeight
+        """ Center points of every column """
+
+        # built from the positions above rather than ls.getRayFromLEDToSensor, whose cache could still hold
+        # rays of a previous geometry; the rays have to match the key
+        starts = self.ledPositions[self.rayLED]
+        ends = self.sensorPositions[self.raySensor]
+        rays: List[Ray] = [Ray(*coordinates) for coordinates in np.hstack((starts, ends)).tolist()]
+        self.rayLengths: np.ndarray = np.hypot(*(ends - starts).T)
+
+        self.A: sparse.csr_matrix = self._load()
+        """ The influence matrix; one row per ray """
+        if self.A is None:
+            ray_ind, cell_i, cell_j, weights = ray_model.getInfluencesForRays(rays)
+            coo = sparse.coo_matrix((weights, (ray_ind, cell_j * self.gridDefinition.cellsX + cell_i)), shape=(m, n))
+            self.A = coo.tocsr()
+            self.A.eliminate_zeros()
+            self._store()
+        self.AT: sparse.csr_matrix = self.A.T.tocsr()
+        """ The transposed influence matrix; one row per cell """
+
+        self.rayWeights: np.ndarray = np.asarray(self.A.sum(axis=1)).ravel()
+        """ Summed influences of every ray """
+        self.cellWeights: np.ndarray = np.asarray(self.AT.sum(axis=1)).ravel()
+        """ Summed influences of every cell on all rays """
+
+    @classmethod
+    def keyFor(cls, ls: LightSkin, ray_model: RayGridInfluenceModel) -> Tuple:
+        """ Returns the values a matrix for the given skin and ray model depends on """
+        g = ray_model.gridDefinition
+        return (tuple(ls.LEDs), tuple(ls.sensors),
+                (g.startX, g.startY, g.endX, g.endY, g.cellsX, g.cellsY),
+                ray_model.__class__.__name__, ray_model.parameters())
+
+    @classmethod
+    def forModel(cls, ls: LightSkin, ray_model: RayGridInfluenceModel) -> 'InfluenceMatrix':
+        """ Returns the matrix for the given skin and ray model; only built if not already available """
+        key = cls.keyFor(ls, ray_model)
+        with cls._cacheLock:
+            matrix = cls._cache.pop(key, None)
+            if matrix is None:
+                matrix = cls(ls, ray_model)
+            cls._cache[key] = matrix  # (re-)insert as most recently used
+            while len(cls._cache) > cls.MAX_CACHED:
+                del cls._cache[next(iter(cls._cache))]
+            return matrix
+
+    def _load(self) -> sparse.csr_matrix:
+        """ Returns the matrix from the disk cache if available """
+        if self.diskCache is None:
+            return None
+        data = self.diskCache.load(self.__class__.__name__, self.key)
+        if data is None or tuple(data['shape']) != (len(self.rayLengths), len(self.cellI)):
+            return None
+        return sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+
+    def _store(self):
+        """ Writes the matrix to the disk cache if configured """
+        if self.diskCache is None:
+            return
+        try:
+            self.diskCache.store(self.__class__.__name__, self.key, {
+                'data': self.A.data, 'indices': self.A.indices, 'indptr': self.A.indptr,
+                'shape': np.array(self.A.shape)})
+        except OSError as e:
+            print("Could not store influence matrix: %s" % e)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.A.shape
+
+    @staticmethod
+    def entryIndices(A: sparse.csr_matrix) \
+            -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix, sparse.csr_matrix]:
+        """ Describes the stored entries of the given (selection of rows of an) influence matrix:
+            returns the row and column of every entry and two sparse matrices summing values given per entry
+            by row (rows x entries) and by column (columns x entries) """
+        nnz = len(A.data)
+        entries = np.arange(nnz)
+        entry_row = np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))
+        row_sum = sparse.csr_matrix((np.ones(nnz), entries, A.indptr), shape=(A.shape[0], nnz))
+        column_sum = sparse.csr_matrix((np.ones(nnz), (A.indices, entries)), shape=(A.shape[1], nnz))
+        return entry_row, A.indices, row_sum, column_sum
+
+    def rayIndex(self, sensor: int, led: int) -> int:
+        """ Returns the row of the ray from the given LED to the given sensor """
+        return led * self.sensorCount + sensor
+
+    def cellIndex(self, i: int, j: int) -> int:
+        """ Returns the column of the given cell """
+        return j * self.gridDefinition.cellsX + i
+
+    def getInfluencesForRay(self, sensor: int, led: int) -> List[Tuple[Tuple[int, int], float]]:
+        """ Returns the cells and their weights for the given ray in the format of `RayGridInfluenceModel` """
+        r = self.rayIndex(sensor, led)
+        start, end = self.A.indptr[r], self.A.indptr[r + 1]
+        cols = self.A.indices[start:end]
+        return list(zip(zip(self.cellI[cols].tolist(), self.cellJ[cols].tolist()), self.A.data[start:end].tolist()))
+
+    def rayValues(self, func: Callable[[int, int], float]) -> np.ndarray:
+        """ Evaluates `func(sensor, led)` for every ray in row order """
+        return np.fromiter((func(s, l) for l, s in zip(self.rayLED.tolist(), self.raySensor.tolist())),
+                           dtype=float, count=self.A.shape[0])
+
+    def toGrid(self, values: np.ndarray) -> np.ndarray:
+        """ Converts a vector with one value per column into a grid indexed by `[i][j]`;
+            an array of shape (T, columns) is converted into T grids of shape (cellsX, cellsY) """
+        values = np.asarray(values)
+        shape = values.shape[:-1] + (self.gridDefinition.cellsY, self.gridDefinition.cellsX)
+        return np.ascontiguousarray(values.reshape(shape).swapaxes(-1, -2))
+
+    def fromGrid(self, grid) -> np.ndarray:
+        """ Converts a grid indexed by `[i][j]` into a vector with one value per column """
+        return np.asarray(grid, dtype=float).T.ravel()
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Union
+from functools import wraps
+from typing import Callable, List, Tuple, Union
 
 import math
+import numpy as np
 
+from ...Helpers.BoundedCache import BoundedCache
 from ...Helpers.Grids import ValueGridDefinition
 
 
@@ -85,14 +88,61 @@ class Ray:
         return px, py
 
 
+def cachedInfluences(func: Callable[['RayGridInfluenceModel', Ray], List[Tuple[Tuple[int, int], float]]]):
+    """ Decorator for `getInfluencesForRay`: caches the results in the `influenceCache` of the model instance.
+        Rays are identified by their coordinates. """
+    @wraps(func)
+    def wrapper(self: 'RayGridInfluenceModel', ray: Ray) -> List[Tuple[Tuple[int, int], float]]:
+        key = (ray.start_x, ray.start_y, ray.end_x, ray.end_y)
+        return self.influenceCache.get(key, lambda: func(self, ray))
+
+    return wrapper
+
+
 class RayGridInfluenceModel(ABC):
     """ A model describing how much influence cells of the given grid have on a given ray. """
 
-    def __init__(self, grid_definition: ValueGridDefinition = None):
-        self.gridDefinition: ValueGridDefinition = grid_definition
+    CACHE_SIZE = 512
+    """ Default capacity of the influence cache """
+
+    def __init__(self, grid_definition: ValueGridDefinition = None, cache: BoundedCache = None):
+        self.influenceCache: BoundedCache = cache if cache is not None else BoundedCache(self.CACHE_SIZE)
+        """ Cache for the influences of single rays; emptied when the grid changes """
+        self._gridDefinition: ValueGridDefinition = None
+        self.gridDefinition = grid_definition
+        self._state: Tuple = None
+        self._version: int = 0
+
+    @property
+    def gridDefinition(self) -> ValueGridDefinition:
+        return self._gridDefinition
+
+    @gridDefinition.setter
+    def gridDefinition(self, grid_definition: ValueGridDefinition):
+        """ Change the grid; cached influences are dropped if it is a different grid """
+        if grid_definition is not self._gridDefinition:
+            self.influenceCache.clear()
+        self._gridDefinition = grid_definition
 
     def __hash__(self):
-        return hash((self.__class__.__name__, self.gridDefinition))
+        return hash((self.__class__.__name__, self.gridDefinition, self.parameters()))
+
+    @property
+    def version(self) -> int:
+        """ A counter that is increased whenever the grid or the parameters changed;
+            cached influences are dropped then """
+        g = self._gridDefinition
+        state = (None if g is None else (g.startX, g.startY, g.endX, g.endY, g.cellsX, g.cellsY), self.parameters())
+        if state != self._state:
+            if self._state is not None:
+                self.influenceCache.clear()
+            self._state = state
+            self._version += 1
+        return self._version
+
+    def parameters(self) -> Tuple:
+        """ Returns the parameters (apart from the grid) the influences of this model depend on """
+        return ()
 
     @abstractmethod
     def getInfluencesForRay(self, ray: Ray) -> List[Tuple[Tuple[int, int], float]]:
@@ -102,3 +152,23 @@ class RayGridInfluenceModel(ABC):
             The list should not contain duplicate cells
         """
         raise NotImplementedError("Method not yet implemented")
+
+    def getInfluencesForRays(self, rays: List[Ray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Returns the influences of all given rays in the current grid as COO arrays `(ray, i, j, weight)`,
+            where `ray` is the index of the ray in the given list.
+
+            Falls back to `getInfluencesForRay`; subclasses can override this to process all rays at once.
+        """
+        ray_ind: List[int] = []
+        cell_i: List[int] = []
+        cell_j: List[int] = []
+        weights: List[float] = []
+        for r, ray in enumerate(rays):
+            for (i, j), w in self.getInfluencesForRay(ray):
+                ray_ind.append(r)
+                cell_i.append(i)
+                cell_j.append(j)
+                weights.append(w)
+        return (np.array(ray_ind, dtype=np.intp), np.array(cell_i, dtype=np.intp),
+                np.array(cell_j, dtype=np.intp), np.array(weights, dtype=float))
@@ -1,9 +1,9 @@
-from functools import lru_cache
 from typing import Tuple, List, Dict
 
 import math
+import numpy as np
 
-from .RayInfluenceModel import RayGridInfluenceModel, Ray
+from .RayInfluenceModel import RayGridInfluenceModel, Ray, cachedInfluences
 
 
 class WideRayGridInfluenceModel(RayGridInfluenceModel):
@@ -12,8 +12,13 @@ class WideRayGridInfluenceModel(RayGridInfluenceModel):
     """
 
     max_distance = 1.0
+    RAY_BATCH_CELLS = 1 << 22
+    """ Maximum number of (ray, cell) candidates evaluated at once by getInfluencesForRays """
 
-    @lru_cache(maxsize=512)
+    def parameters(self) -> Tuple:
+        return self.max_distance,
+
+    @cachedInfluences
     def getInfluencesForRay(self, ray: Ray) -> List[Tuple[Tuple[int, int], float]]:
 
         # find relevant x coordinates
@@ -71,6 +76,98 @@ class WideRayGridInfluenceModel(RayGridInfluenceModel):
 
         return values
 
+    def getInfluencesForRays(self, rays: List[Ray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Same result as getInfluencesForRay for every ray, but evaluates the candidate cells of many rays
+            at once with array operations.
+        """
+        g = self.gridDefinition
+        n = g.cellsX * g.cellsY
+        batch = max(1, self.RAY_BATCH_CELLS // max(1, n))
+
+        results = [self._getInfluencesForRayBatch(rays, r, min(len(rays), r + batch))
+                   for r in range(0, len(rays), batch)]
+        if len(results) == 0:
+            return (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp),
+                    np.zeros(0, dtype=np.intp), np.zeros(0, dtype=float))
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    def _getInfluencesForRayBatch(self, rays: List[Ray], first: int, last: int):
+        """ Vectorized getInfluencesForRay for the rays `first` to `last` (exclusive) """
+        g = self.gridDefinition
+        coords = np.array([(r.start_x, r.start_y, r.end_x, r.end_y) for r in rays[first:last]],
+                          dtype=float).reshape(-1, 4)
+        # one row per ray
+        start_x, start_y, end_x, end_y = (coords[:, k:k + 1] for k in range(4))
+        ray_dx = end_x - start_x
+        ray_dy = end_y - start_y
+        length = np.sqrt(ray_dx ** 2 + ray_dy ** 2)
+        c = end_x * start_y - start_x * end_y
+
+        # relevant columns
+        md = np.copysign(self.max_distance, ray_dx)
+        i_a = self._indexAt(start_x - md, g.startX, g.cellWidth, g.cellsX)
+        i_b = self._indexAt(end_x + md, g.startX, g.cellWidth, g.cellsX)
+        i = np.arange(g.cellsX)
+        x = g.startX + (i + 0.5) * g.cellWidth
+        in_columns = (i >= np.minimum(i_a, i_b)) & (i <= np.maximum(i_a, i_b))
+
+        # relevant rows within every column
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y_a = (self.max_distance * length - c - ray_dy * x) / -ray_dx
+            y_b = (- self.max_distance * length - c - ray_dy * x) / -ray_dx
+        vertical = ~(np.abs(ray_dx) > 0)
+        y_a = np.where(vertical, g.startY, np.clip(y_a, g.startY, g.endY))
+        y_b = np.where(vertical, g.endY, np.clip(y_b, g.startY, g.endY))
+        j_a = self._indexAt(y_a, g.startY, g.cellHeight, g.cellsY)
+        j_b = self._indexAt(y_b, g.startY, g.cellHeight, g.cellsY)
+        j = np.arange(g.cellsY)
+        candidates = in_columns[:, :, np.newaxis] \
+            & (j >= np.minimum(j_a, j_b)[:, :, np.newaxis]) \
+            & (j <= np.maximum(j_a, j_b)[:, :, np.newaxis])
+        ray_ind, cell_i, cell_j = np.nonzero(candidates)
+
+        # closest point on the ray for every candidate cell
+        rdx = ray_dx[ray_ind, 0]
+        rdy = ray_dy[ray_ind, 0]
+        rc = c[ray_ind, 0]
+        rlength = length[ray_ind, 0]
+        cx = g.startX + (cell_i + 0.5) * g.cellWidth
+        cy = g.startY + (cell_j + 0.5) * g.cellHeight
+        len2 = rdx ** 2 + rdy ** 2
+        bxay = rdx * cx + rdy * cy
+        px = (rdx * bxay - rdy * rc) / len2
+        py = (rdy * bxay + rdx * rc) / len2
+        dx = np.abs(px - cx)
+        dy = np.abs(py - cy)
+        dl = (rdx * ((px - start_x[ray_ind, 0]) / rlength) + rdy * ((py - start_y[ray_ind, 0]) / rlength)) / rlength
+
+        # limit ray to from LED to sensor
+        on_ray = (0 < dl) & (dl < 1)
+        ray_ind, cell_i, cell_j = ray_ind[on_ray], cell_i[on_ray], cell_j[on_ray]
+        dx, dy, dl = dx[on_ray], dy[on_ray], dl[on_ray]
+        ray_ind += first
+
+        if self._hasVectorizedInfluence():
+            influence = self.getInfluencesFromDistances(dx, dy, dl, rlength[on_ray])
+        else:
+            influence = np.array([self.getInfluenceFromDistance(*args, rays[r])
+                                  for r, *args in zip(ray_ind.tolist(), dx.tolist(), dy.tolist(), dl.tolist())],
+                                 dtype=float)
+
+        return ray_ind, cell_i, cell_j, influence
+
+    @staticmethod
+    def _indexAt(v: np.ndarray, start: float, size: float, cells: int) -> np.ndarray:
+        """ Vectorized getIatX / getJatY """
+        return np.clip(np.trunc((v - start) / size), 0, cells - 1).astype(np.intp)
+
+    def _hasVectorizedInfluence(self) -> bool:
+        """ Subclasses that only override the scalar influence function are evaluated cell by cell """
+        cls = type(self)
+        return cls.getInfluenceFromDistance is WideRayGridInfluenceModel.getInfluenceFromDistance \
+            or cls.getInfluencesFromDistances is not WideRayGridInfluenceModel.getInfluencesFromDistances
+
     def getInfluenceFromDistance(self, dx: float, dy: float, dl: float, ray: Ray) -> float:
         """
             Returns the influence of a cell given the minimal distance to the direct ray
@@ -83,3 +180,15 @@ class WideRayGridInfluenceModel(RayGridInfluenceModel):
             :return: intensity
         """
         return 1/(1 + 0.1 * ((dx**2 + dy**2)*100)**1.5) / ray.length
+
+    def getInfluencesFromDistances(self, dx: np.ndarray, dy: np.ndarray, dl: np.ndarray,
+                                   ray_length: np.ndarray) -> np.ndarray:
+        """
+            Vectorized getInfluenceFromDistance; subclasses overriding one of them should override both
+            :param dx: x distances to the rays
+            :param dy: y distances to the rays
+            :param dl: positions along the rays; 0.0 = led; 1.0 = sensor
+            :param ray_length: lengths of the rays in question
+            :return: intensities
+        """
+        return 1/(1 + 0.1 * ((dx**2 + dy**2)*100)**1.5) / ray_length
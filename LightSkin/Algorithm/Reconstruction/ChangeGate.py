@@ -0,0 +1,100 @@
+from typing import Tuple
+
+import numpy as np
+
+from ..SimpleCalibration import SimpleCalibration
+from ...LightSkin import BackwardModel
+
+
+class ChangeGate(BackwardModel):
+    """ Runs a backward model only when the sensor values changed noticeably.
+
+        Every ray of a new frame is compared to the frame the current reconstruction is based on. It changed if it
+        differs by more than `threshold` relative to its expected value, or by more than `noiseFactor` standard
+        deviations where the calibration measured them (SimpleCalibration with several frames).
+        Rays the model does not use (expected value below its MIN_SENSITIVITY) are ignored.
+
+        Frames without changed rays are skipped. If at most `localFraction` of the rays changed, the model only
+        updates the cells these rays cover (see BackwardModel.calculateChanged); otherwise everything.
+        Changes of the geometry or the calibration version always lead to a full calculation.
+        The model is given the compared frame (see calculateFrame), so the reference always is the frame the
+        reconstruction was made from. The grid is the one of the model.
+    """
+
+    def __init__(self, model: BackwardModel,
+                 threshold: float = 0.02,
+                 noise_factor: float = 3.0,
+                 local_fraction: float = 0.1):
+        super().__init__(model.ls, model.gridDefinition.cellsX, model.gridDefinition.cellsY, model.calibration)
+        self.gridDefinition = model.gridDefinition
+        self.grid = model.grid
+        self.model: BackwardModel = model
+        self.threshold: float = threshold
+        """ Minimal change of a ray relative to its expected value """
+        self.noiseFactor: float = noise_factor
+        """ Minimal change of a ray in standard deviations of its calibration frames """
+        self.localFraction: float = local_fraction
+        """ Maximal fraction of changed rays for a local update """
+
+        self.changedRays: int = 0
+        """ Number of rays that changed in the last frame """
+        self.skippedFrames: int = 0
+        self.localUpdates: int = 0
+        self.fullUpdates: int = 0
+
+        self._reference: np.ndarray = None
+        """ The sensor values the current reconstruction is based on, indexed by [led][sensor] """
+        self._referenceState: Tuple = None
+        """ Geometry and calibration version of the reference """
+
+    def calculate(self) -> bool:
+        """ Updates the reconstruction if the current frame changed; returns whether the grid was updated """
+        frame = np.array(self._currentFrame(), dtype=float)
+        state = (self.ls.geometryVersion, self.calibration.version)
+        if self._reference is None or self._referenceState != state or self._reference.shape != frame.shape:
+            self.changedRays = frame.size
+            return self._calculateAll(frame, state)
+
+        rays = np.flatnonzero(np.abs(frame - self._reference) > self._changeLimits())
+        self.changedRays = len(rays)
+        if len(rays) == 0:
+            self.skippedFrames += 1
+            return False
+        if len(rays) > self.localFraction * frame.size:
+            return self._calculateAll(frame, state)
+
+        updated = self.model.calculateFrame(frame, rays)
+        if updated:
+            # a failed update keeps the old reference, so the frame is tried again
+            self._reference.ravel()[rays] = frame.ravel()[rays]
+        self.localUpdates += 1
+        self.grid = self.model.grid
+        return bool(updated)
+
+    def reconstructBatch(self, frames: np.ndarray) -> np.ndarray:
+        """ Batches are passed on to the model; the next frame is calculated completely """
+        grids = self.model.reconstructBatch(frames)
+        self.grid = self.model.grid
+        self.reset()
+        return grids
+
+    def reset(self):
+        """ Forget the reference frame; the next frame is calculated completely """
+        self._reference = None
+
+    def _calculateAll(self, frame: np.ndarray, state: Tuple) -> bool:
+        updated = self.model.calculateFrame(frame)
+        if updated:
+            self._reference = frame
+            self._referenceState = state
+        self.fullUpdates += 1
+        self.grid = self.model.grid
+        return bool(updated)
+
+    def _changeLimits(self) -> np.ndarray:
+        """ Returns the change of every ray that is still considered noise, indexed by [led][sensor] """
+        expected = self.calibration.expectedSensorValues()
+        limits = self.threshold * expected
+        if isinstance(self.calibration, SimpleCalibration) and self.calibration.variance.shape == expected.shape:
+            limits = np.maximum(limits, self.noiseFactor * np.sqrt(self.calibration.variance))
+        return np.where(expected > getattr(self.model, 'MIN_SENSITIVITY', 0.0), limits, np.inf)
@@ -0,0 +1,23 @@
+from typing import Tuple
+
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
+from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
+
+
+class InfluenceMatrixModel:
+    """ Mixin for backward models working on the InfluenceMatrix of a ray model on their grid """
+
+    def _initInfluenceMatrix(self, ray_model: RayGridInfluenceModel):
+        self.rayModel: RayGridInfluenceModel = ray_model
+        self.rayModel.gridDefinition = self.gridDefinition
+        self._matrix: InfluenceMatrix = None
+        self._geometryState: Tuple = None
+        """ Versions of skin geometry and ray model the current matrix was fetched for """
+
+    def _updateInfluenceMatrix(self) -> InfluenceMatrix:
+        """ Fetches the influence matrix for the current skin geometry and grid; only if either changed """
+        geometry_state = (self.ls.geometryVersion, self.rayModel.version)
+        if self._matrix is None or self._geometryState != geometry_state:
+            self._matrix = InfluenceMatrix.forModel(self.ls, self.rayModel)
+            self._geometryState = geometry_state
+        return self._matrix
@@ -0,0 +1,162 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sparse
+
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
+
+
+class IterativeBackProjection(ABC):
+    """ Shared parts of the repeated back projections, to be mixed into a BackwardModel:
+        the iteration parameters, the state of the last reconstruction and the loop driving the iterations.
+        The subclass works on the internal buffer `_buf` (indexed by [column of the influence matrix][frame]);
+        it selects the used rays with their measurements (`_prepareRays`), chooses the initial buffer
+        (`_initialBuffer`), projects the buffer onto the rays (`_projectedRays`), converts it into maps
+        (`_bufferMap`) and runs a single iteration (`_calculate_iteration`). """
+
+    def _initIterations(self,
+                        repetitions: int,
+                        tolerance: float,
+                        residual_tolerance: float,
+                        max_time: Optional[float],
+                        warm_start: bool):
+        self.repetitions: int = repetitions
+        """ Maximal number of iterations """
+        self.tolerance: float = tolerance
+        """ Converged when the relative change of the map in an iteration is at most this; 0 to disable """
+        self.residualTolerance: float = residual_tolerance
+        """ Converged when the residual is at most this, e.g. the noise level of the sensors; 0 to disable """
+        self.maxTime: Optional[float] = max_time
+        """ Time budget per reconstruction in seconds; no further iteration is started if it would not finish
+            in time (judged by the previous one), the map reached until then is used. Unlimited if None """
+        self.warmStart: bool = warm_start
+        """ Start from the last reconstruction instead of from scratch, as long as the geometry and the
+            calibration did not change; consecutive frames are similar, so they need only a few iterations """
+        self._previous: np.ndarray = None
+        """ The last reconstruction as in the internal buffer (of the last frame of a batch), for warm starts """
+        self._previousState: Tuple = None
+        """ Geometry and calibration the last reconstruction was made with """
+
+        self.iterations: int = 0
+        """ Number of iterations used in the last reconstruction """
+        self.residuals: np.ndarray = np.zeros(0)
+        """ The residual of every frame of the last reconstruction """
+        self.converged: bool = False
+        """ Whether the last reconstruction converged (and was not stopped by `repetitions` or `maxTime`) """
+
+        self._rays: np.ndarray = np.zeros(0, dtype=np.intp)
+        """ The rays used: those with an expected value above MIN_SENSITIVITY """
+        self._raysA: sparse.csr_matrix = None
+        """ The rows of the influence matrix of the used rays """
+        self._raysAT: sparse.csr_matrix = None
+        self._raysEntries: Tuple = None
+        """ InfluenceMatrix.entryIndices of the used rays; only calculated when needed """
+        self._raysState: Tuple = None
+        """ Matrix, calibration version and sensitivity threshold the used rays were selected for """
+        self._raysMeasured: np.ndarray = np.zeros((0, 1))
+        """ The measurement of every used ray in the form the subclass projects, indexed by [ray][frame] """
+
+    def calculate(self):
+        self.reconstructBatch(self._currentFrame()[np.newaxis])
+        return True
+
+    def reconstructBatch(self, frames: np.ndarray) -> np.ndarray:
+        deadline = None if self.maxTime is None else time.perf_counter() + self.maxTime
+        vals = self._rayArray(frames)
+        self._prepareRays(vals)
+
+        # reset internal buffer; to the last reconstruction for warm starts, unless that one is broken
+        state = (self._geometryState, self.calibration.version)
+        if self.warmStart and self._previous is not None and self._previousState == state \
+                and np.isfinite(self._previous).all():
+            initial = self._initialBuffer(self._previous)
+        else:
+            initial = self._initialBuffer(None)
+        self._buf = np.repeat(initial[:, np.newaxis], len(vals), axis=1)
+
+        self.iterations = 0
+        self.converged = False
+        iteration_time = 0.0
+        current = self._bufferMap()
+        while self.iterations < self.repetitions:
+            iteration_start = time.perf_counter()
+            if deadline is not None and iteration_start + iteration_time > deadline:
+                break
+            residuals = self._calculate_iteration()
+            self.iterations += 1
+            previous, current = current, self._bufferMap()
+            if self._converged(previous, current, residuals):
+                self.converged = True
+                break
+            iteration_time = time.perf_counter() - iteration_start
+        self.residuals = self._residuals(self._projectedRays())
+        if len(vals) > 0:
+            self._previous = self._buf[:, -1].copy()
+            self._previousState = state
+
+        # update actual map
+        grids = self._matrix.toGrid(current.T)
+        if len(grids) > 0:
+            self.grid = grids[-1]
+        return grids
+
+    def reset(self):
+        """ Forget the last reconstruction; the next one starts from scratch """
+        self._previous = None
+
+    @property
+    def residual(self) -> float:
+        """ The largest residual of the frames of the last reconstruction """
+        return float(self.residuals.max()) if len(self.residuals) > 0 else 0.0
+
+    def _selectRays(self, matrix: InfluenceMatrix) -> np.ndarray:
+        """ Selects the used rays and their rows of the given influence matrix, only if the matrix, the calibration
+            or MIN_SENSITIVITY changed; returns the expected values of all rays """
+        expected = self.calibration.expectedSensorValues().ravel()
+        rays_state = (matrix.key, self.calibration.version, self.MIN_SENSITIVITY)
+        if self._raysState != rays_state:
+            self._rays = np.flatnonzero(expected > self.MIN_SENSITIVITY)
+            self._raysA = matrix.A[self._rays]
+            self._raysAT = self._raysA.T.tocsr()
+            self._raysEntries = None
+            self._raysState = rays_state
+        return expected
+
+    @abstractmethod
+    def _prepareRays(self, vals: np.ndarray):
+        """ Selects the rays to use and their measurements of the given frames, indexed by [frame][ray] """
+        raise NotImplementedError("Method not yet implemented")
+
+    @abstractmethod
+    def _initialBuffer(self, previous: Optional[np.ndarray]) -> np.ndarray:
+        """ Returns the internal buffer of a single frame to start from; from the given previous one for warm starts """
+        raise NotImplementedError("Method not yet implemented")
+
+    @abstractmethod
+    def _projectedRays(self) -> np.ndarray:
+        """ Returns the projection of the current buffer onto the used rays, comparable to `_raysMeasured`,
+            indexed by [ray][frame] """
+        raise NotImplementedError("Method not yet implemented")
+
+    @abstractmethod
+    def _bufferMap(self) -> np.ndarray:
+        """ Returns the translucency of every cell in the current buffer as a new array, indexed by [cell][frame] """
+        raise NotImplementedError("Method not yet implemented")
+
+    @abstractmethod
+    def _calculate_iteration(self) -> np.ndarray:
+        """ Updates the buffer; returns the residuals of every frame before the update """
+        raise NotImplementedError("Method not yet implemented")
+
+    def _converged(self, previous: np.ndarray, current: np.ndarray, residuals: np.ndarray) -> bool:
+        """ Whether the reconstructions of all frames converged, given the maps before and after an iteration
+            and the residuals it started with """
+        change = np.linalg.norm(current - previous, axis=0)
+        return bool(np.all((change <= self.tolerance * np.linalg.norm(current, axis=0))
+                           | (residuals <= self.residualTolerance)))
+
+    def _residuals(self, current: np.ndarray) -> np.ndarray:
+        """ Returns the RMS difference between the measured and the given projection of the used rays per frame """
+        return np.sqrt(((self._raysMeasured - current) ** 2).sum(axis=0) / max(len(self._rays), 1))
@@ -1,19 +1,22 @@
-import math
 import time
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import scipy.sparse as sparse
 import scipy.optimize as optimize
 import numpy as np
 
+from .InfluenceMatrixModel import InfluenceMatrixModel
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...LightSkin import LightSkin, Calibration, BackwardModel
 
 
-class LogarithmicLinSysOptimize(BackwardModel):
-    """ Converts the problem into a set of linear equations and solves them using standard libraries """
+class LogarithmicLinSysOptimize(InfluenceMatrixModel, BackwardModel):
+    """ Converts the problem into a set of linear equations and solves them using standard libraries.
+        After every reconstruction `iterations`, `residual` and `converged` describe the quality of the solution. """
     MIN_SENSITIVITY = 0.02
     _MIN_TRANSLUCENCY = 0.000001
     """ Minimal translucency is relevant in log space so we don't get -inf as values """
+    _POSITIVE = False
+    """ Whether the system is built for the negated logarithm, so the solution is nonnegative """
 
     def __init__(self, ls: LightSkin,
                  gridWidth: int,
@@ -24,93 +27,174 @@ class LogarithmicLinSysOptimize(BackwardModel):
         self._tmpGrid = []
         self._tmpGridWeights = []
         self._bufGrid: List[List[float]] = []
-        self.rayModel: RayGridInfluenceModel = ray_model
-        self.rayModel.gridDefinition = self.gridDefinition
+        self._initInfluenceMatrix(ray_model)
         """ Contains the weights while they are being built in log space """
 
-        self._construct_hash = None
+        self._rowsState: Tuple = None
+        """ Matrix, calibration version and sensitivity threshold the current rows were selected for """
+        self._rows: np.ndarray = None
+        """ The rays used as equations: those with an expected value above MIN_SENSITIVITY """
         self._lgs_A: sparse.csr_matrix = None
-        self._lgs_b: List[float] = []
-        self._lgs_sol: List[float] = []
+        self._lgs_b: np.ndarray = np.zeros(0)
+        """ The b vector; a matrix with one column per frame when reconstructing a batch """
+        self._lgs_sol: np.ndarray = np.zeros(0)
+
+        self.maxTime: Optional[float] = None
+        """ Time budget per reconstruction in seconds, for solvers that can be stopped early with the solution
+            reached so far (see LogarithmicLinSysOptimize2); lsq_linear used here can not. Unlimited if None """
+        self._deadline: Optional[float] = None
+        """ When the current reconstruction has to be finished, from time.perf_counter() """
+
+        self.verbose: bool = True
+        """ Print the times needed for every reconstruction """
+
+        self.iterations: int = 0
+        """ Number of solver iterations in the last reconstruction, summed over all frames """
+        self.residuals: np.ndarray = np.zeros(0)
+        """ RMS residual of the system (in log space) for every frame of the last reconstruction """
+        self.converged: bool = False
+        """ Whether the solver converged for all frames of the last reconstruction """
+
+    @property
+    def residual(self) -> float:
+        """ The largest residual of the frames of the last reconstruction """
+        return float(self.residuals.max()) if len(self.residuals) > 0 else 0.0
 
     def calculate(self):
         try:
             t1 = time.perf_counter()
-            self._build_system()
+            self._deadline = None if self.maxTime is None else t1 + self.maxTime
+            self._build_system(self._POSITIVE)
             t2 = time.perf_counter()
             self._solve_system()
+            self._update_residuals()
             t3 = time.perf_counter()
-            self._apply_solution()
+            self._apply_solution(self._POSITIVE)
             t4 = time.perf_counter()
-            print("Times needed for reconstruction: %f %f %f" % (t2 - t1, t3 - t2, t4 - t3))
+            if self.verbose:
+                print("Times needed for reconstruction: %f %f %f" % (t2 - t1, t3 - t2, t4 - t3))
+            return True
         except Exception as e:
             print("Exception when trying to reconstruct data")
             print(e)
+            return False
 
-    def _build_system(self, positive=False, force_full_build=False):
-        """ Builds the system of linear equations from rays and sensor data """
-        # Number of rows in the matrix; every ray (LEDs x Sensors) is one equation
-        m = len(self.ls.LEDs) * len(self.ls.sensors)
-        # Number of columns: the variables we are searching
-        n = self.gridDefinition.cellsX * self.gridDefinition.cellsY
-
-        c_hash = hash((m, n, self.calibration, self.rayModel))
-        if self._construct_hash != c_hash:
-            force_full_build = True
-        self._construct_hash = c_hash
-
-        self._lgs_b = []
-        rows: List[sparse.csr_matrix] = []
-
-        # Build matrix row by row and b vector
-        for i_l, l in enumerate(self.ls.LEDs):
-            for i_s, s in enumerate(self.ls.sensors):
-                expected_val = self.calibration.expectedSensorValue(i_s, i_l)
-                if expected_val > self.MIN_SENSITIVITY:
-                    val = max(self._MIN_TRANSLUCENCY, self.ls.forwardModel.getSensorValue(i_s, i_l))
-                    translucency = math.log(val / expected_val)\
-                        if expected_val > self.MIN_SENSITIVITY else 0.0
-                    translucency = min(translucency, -0.0)  # make sure we are in a valid area
-                    if positive:
-                        translucency = abs(translucency)
-
-                    # Expected result into b-vector
-                    self._lgs_b.append(translucency)
-
-                    if force_full_build:
-                        # build sparse row
-                        ray = self.ls.getRayFromLEDToSensor(i_s, i_l)
-                        cells = self.rayModel.getInfluencesForRay(ray)
-
-                        data: List[float] = [0.0] * len(cells)
-                        col_ind: List[int] = [0] * len(cells)
-                        for i, ((x, y), w) in enumerate(cells):
-                            data[i] = w
-                            col_ind[i] = y * self.gridDefinition.cellsX + x
-                            # if x == 0 and y == 0:
-                            #     print("in matr w %i weight for %i (%i %i) %f" % (n, col_ind[i], x, y, w))
-
-                        row = sparse.csr_matrix((data, col_ind, [0, len(data)]), shape=(1, n))
-                        rows.append(row)
-
-        if force_full_build:
-            self._lgs_A = sparse.vstack(rows)
+    def calculateChanged(self, rays: np.ndarray) -> bool:
+        """ Solves the system again only for the cells covered by the changed rays, using all rays through these
+            cells as equations and keeping the other cells at the previous solution.
+            Calculates everything if there is no previous solution of the same system. """
+        previous_A, previous_sol = self._lgs_A, self._lgs_sol
+        try:
+            self._deadline = None if self.maxTime is None else time.perf_counter() + self.maxTime
+            self._build_system(self._POSITIVE)
+            A = self._lgs_A
+            if A is not previous_A or np.ndim(previous_sol) != 1 or len(previous_sol) != A.shape[1]:
+                return self.calculate()
+
+            cells = np.unique(A[np.flatnonzero(np.isin(self._rows, rays))].indices)
+            sol = np.array(previous_sol, dtype=float)
+            self.iterations = 0
+            self.converged = True
+            if len(cells) > 0:
+                equations = np.flatnonzero(np.diff(A[:, cells].indptr))
+                A_equations = A[equations]
+                A_local = A_equations[:, cells]
+                b_local = self._lgs_b[equations] - A_equations @ sol + A_local @ sol[cells]
+                sol[cells] = self._solve_local(cells, A_local, b_local, sol[cells])
+            self._lgs_sol = sol
+            self._update_residuals()
+            self._apply_solution(self._POSITIVE)
+            return True
+        except Exception as e:
+            print("Exception when trying to reconstruct data")
+            print(e)
+            return False
+
+    def reconstructBatch(self, frames: np.ndarray) -> np.ndarray:
+        """ Solves the system for all frames at once: the b side gets one column per frame """
+        self._deadline = None if self.maxTime is None else time.perf_counter() + self.maxTime
+        self._build_system(self._POSITIVE, frames=self._rayArray(frames))
+        self._solve_system()
+        self._update_residuals()
+        return self._apply_solution(self._POSITIVE)
+
+    def _build_system(self, positive=False, force_full_build=False, frames: np.ndarray = None):
+        """ Builds the system of linear equations from rays and sensor data.
+            Only the b vector is rebuilt for every frame; the matrix only if the geometry, the ray model
+            or the set of rays above MIN_SENSITIVITY changed.
+            The b vector is built from the current frame, or a matrix with one column per row of `frames`
+            (sensor values indexed by [frame][ray]) if given. """
+        # every ray (LEDs x Sensors) is one equation; the variables we are searching are the cells
+        matrix = self._updateInfluenceMatrix()
+
+        rows_state = (matrix.key, self.calibration.version, self.MIN_SENSITIVITY)
+        if force_full_build or self._rowsState != rows_state:
+            expected = self.calibration.expectedSensorValues().ravel()
+            rows = np.flatnonzero(expected > self.MIN_SENSITIVITY)
+            if force_full_build or self._rows is None or self._rowsState[0] != matrix.key \
+                    or not np.array_equal(rows, self._rows):
+                self._lgs_A = matrix.A[rows]
+            self._rows = rows
+            self._rowsState = rows_state
+
+        # Build b vector: log(val / expected) of the selected rays
+        if frames is None:
+            vals = self._currentFrame().ravel()[self._rows]
+        else:
+            vals = frames[:, self._rows].T
+        log_expected = self.calibration.logExpectedSensorValues().ravel()[self._rows]
+        b = np.log(np.maximum(vals, self._MIN_TRANSLUCENCY))
+        b -= log_expected.reshape((-1,) + (1,) * (b.ndim - 1))
+        np.minimum(b, -0.0, out=b)  # make sure we are in a valid area
+        if positive:
+            np.abs(b, out=b)
+        self._lgs_b = b
 
     def _solve_system(self):
-        """ solves the system of linear equations """
-        result = optimize.lsq_linear(self._lgs_A, self._lgs_b, (-np.inf, 0), verbose=0)
+        """ solves the system of linear equations; column by column if b has one per frame """
+        self.iterations = 0
+        self.converged = True
+        if self._lgs_b.ndim == 1:
+            self._lgs_sol = self._solve_vector(self._lgs_b)
+            return
+        sol = np.empty((self._lgs_A.shape[1], self._lgs_b.shape[1]))
+        for t in range(sol.shape[1]):
+            sol[:, t] = self._solve_vector(self._lgs_b[:, t])
+        self._lgs_sol = sol
+
+    def _solve_vector(self, b: np.ndarray) -> np.ndarray:
+        """ solves the system for a single b vector """
+        result = optimize.lsq_linear(self._lgs_A, b, (-np.inf, 0), verbose=0)
 
         if not result.success:
             print("No good solution found!")
 
-        self._lgs_sol = result.x
-
-    def _apply_solution(self, positive=False):
-        """ applies the solution of the system to the grid """
-
-        for i, v in enumerate(self._lgs_sol):
-            y, x = divmod(i, self.gridDefinition.cellsX)
-            value = math.exp(-v if positive else v)
-            # if x == 0 and y == 0:
-            #   print("setting val %i %i to %f (%f)" % (x, y, value, v))
-            self.grid[x][y] = value
+        self.iterations += result.nit
+        self.converged = self.converged and bool(result.success)
+        return result.x
+
+    def _solve_local(self, cells: np.ndarray, A: sparse.csr_matrix, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """ solves the part of the system (A, b) for the given cells updated by calculateChanged;
+            x is their previous solution """
+        result = optimize.lsq_linear(A, b, (-np.inf, 0), verbose=0)
+        self.iterations += result.nit
+        self.converged = self.converged and bool(result.success)
+        return result.x
+
+    def _update_residuals(self):
+        """ calculates the residuals of the solution for every frame """
+        r = self._lgs_A @ self._lgs_sol - self._lgs_b
+        r = r.reshape(len(r), -1)
+        self.residuals = np.sqrt((r ** 2).sum(axis=0) / max(len(r), 1))
+
+    def _apply_solution(self, positive=False) -> np.ndarray:
+        """ applies the solution of the system to the grid;
+            returns the maps of all frames if the system was solved for a batch """
+
+        sol = np.asarray(self._lgs_sol)
+        grids = self._matrix.toGrid(np.exp(-sol.T if positive else sol.T))
+        if sol.ndim == 1:
+            self.grid = grids
+        elif len(grids) > 0:
+            self.grid = grids[-1]
+        return grids
@@ -2,32 +2,68 @@ import math
 import time
 from typing import List, Tuple
 import scipy.sparse as sparse
-import scipy.optimize as optimize
 import numpy as np
 
 from .LogarithmicLinSysOptimize import LogarithmicLinSysOptimize
+from .WarmStartNNLS import WarmStartNNLS
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...LightSkin import LightSkin, Calibration, BackwardModel
 
 
 class LogarithmicLinSysOptimize2(LogarithmicLinSysOptimize):
-    """ Converts the problem into a set of linear equations and solves them using standard scipy.nnls """
-    def calculate(self):
-        try:
-            t1 = time.perf_counter()
-            self._build_system(True)
-            t2 = time.perf_counter()
-            self._solve_system()
-            t3 = time.perf_counter()
-            self._apply_solution(True)
-            t4 = time.perf_counter()
-            print("Times needed for reconstruction: %f %f %f" % (t2-t1, t3-t2, t4-t3))
-        except Exception as e:
-            print("Exception when trying to reconstruct data")
-            print(e)
+    """ Converts the problem into a set of linear equations and solves them as nonnegative least squares problem.
+        The solver keeps the Gram matrix of the system and starts from the solution of the previous frame,
+        as long as the geometry and the calibration did not change.
+        With a time budget (`maxTime`) it returns the feasible solution reached when the time is up;
+        `converged` tells whether it is the optimum. """
+    _POSITIVE = True
 
-    def _solve_system(self):
-        """ solves the system of linear equations """
-        result, residual = optimize.nnls(self._lgs_A.toarray(), np.asarray(self._lgs_b))
+    def __init__(self, ls: LightSkin,
+                 gridWidth: int,
+                 gridHeight: int,
+                 calibration: Calibration,
+                 ray_model: RayGridInfluenceModel,
+                 max_iterations: int = None,
+                 max_time: float = None):
+        """ max_iterations limits the solver per frame (see WarmStartNNLS),
+            max_time (in seconds) the time per calculate() / reconstructBatch() call """
+        super().__init__(ls, gridWidth, gridHeight, calibration, ray_model)
+        self.solver: WarmStartNNLS = WarmStartNNLS(max_iterations)
+        self.maxTime = max_time
+        self._localSolver: WarmStartNNLS = WarmStartNNLS(max_iterations)
+        """ Solves the parts of the system updated by calculateChanged """
+        self._solverState: Tuple = None
+        """ Geometry and calibration the solution the solver starts from was calculated with """
 
-        self._lgs_sol = result
\ No newline at end of file
+    def _solve_vector(self, b: np.ndarray) -> np.ndarray:
+        """ solves the system for a single b vector; the frames of a batch are solved in order,
+            each starting from the solution of the one before """
+        self.solver.setMatrix(self._lgs_A)
+        state = (self._geometryState, self.calibration.version)
+        if self._solverState != state:
+            # the previous solution belongs to another system; don't let it seed (a possibly capped) solve
+            self.solver.reset()
+            self._solverState = state
+        return self._solveWith(self.solver, b)
+
+    def _solve_local(self, cells: np.ndarray, A: sparse.csr_matrix, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """ solves the part of the system for the cells updated by calculateChanged, starting from their previous
+            solution and within the time budget; the next full solve starts from the updated solution """
+        self._localSolver.setMatrix(A)
+        self._localSolver.solution = x
+        x = self._solveWith(self._localSolver, b)
+        solution = self.solver.solution
+        if solution is not None and len(solution) == self._lgs_A.shape[1] \
+                and self._solverState == (self._geometryState, self.calibration.version):
+            solution = solution.copy()
+            solution[cells] = x
+            self.solver.solution = solution
+        return x
+
+    def _solveWith(self, solver: WarmStartNNLS, b: np.ndarray) -> np.ndarray:
+        """ solves for b with the given solver in the remaining time; counts its iterations """
+        solver.maxTime = None if self._deadline is None else max(self._deadline - time.perf_counter(), 0.0)
+        x = solver.solve(b)
+        self.iterations += solver.iterations
+        self.converged = self.converged and solver.converged
+        return x
@@ -0,0 +1,95 @@
+import numpy as np
+
+from .LogarithmicLinSysOptimize import LogarithmicLinSysOptimize
+from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
+from ...Helpers.DiskCache import DiskCache
+from ...LightSkin import LightSkin, Calibration
+
+
+class RegularizedLinearReconstruction(LogarithmicLinSysOptimize):
+    """ Solves the same system of linear equations as the LogarithmicLinSysOptimize, but as a linear approximation:
+        Once per geometry / calibration a regularized pseudo inverse of the system matrix is calculated,
+        so every frame only costs one matrix-vector product in log space and clipping the result to <= 0.
+
+        Methods (from the singular value decomposition A = U S Vᵀ, with s_max the largest singular value):
+         * 'tikhonov': minimizes ||Ax - b||² + (regularization * s_max)² ||x||²
+         * 'tsvd': pseudo inverse ignoring singular values below regularization * s_max
+    """
+
+    METHODS = ('tikhonov', 'tsvd')
+
+    diskCache: DiskCache = None
+    """ If set, operators are loaded from / stored in this cache instead of being recalculated in every process """
+
+    def __init__(self, ls: LightSkin,
+                 gridWidth: int,
+                 gridHeight: int,
+                 calibration: Calibration,
+                 ray_model: RayGridInfluenceModel,
+                 regularization: float = 0.05,
+                 method: str = 'tikhonov'):
+        super().__init__(ls, gridWidth, gridHeight, calibration, ray_model)
+        if method not in self.METHODS:
+            raise ValueError("Unknown method %s; use one of %s" % (method, ', '.join(self.METHODS)))
+        self.regularization: float = regularization
+        """ Strength of the regularization relative to the largest singular value of the system """
+        self.method: str = method
+
+        self._operatorMatrix = None
+        self._operatorSettings = None
+        self._operator: np.ndarray = None
+        """ Maps the b vector to the solution; one row per cell """
+
+    def calculateChanged(self, rays: np.ndarray) -> bool:
+        """ The operator couples all cells, so everything is calculated again; that is a single product anyway """
+        return self.calculate()
+
+    def _solve_system(self):
+        """ applies the reconstruction operator, to all frames of a batch in one matrix product;
+            only recalculated if the system matrix or the settings changed """
+        settings = (self.method, self.regularization)
+        if self._operatorMatrix is not self._lgs_A or self._operatorSettings != settings:
+            self._operator = self._loadOrCalculateOperator()
+            self._operatorMatrix = self._lgs_A
+            self._operatorSettings = settings
+
+        sol = self._operator @ self._lgs_b
+        np.minimum(sol, 0.0, out=sol)
+        self._lgs_sol = sol
+        self.iterations = 0
+        self.converged = True
+
+    def _operatorKey(self):
+        """ Identifies the operator for the current matrix, selected rays and settings """
+        return (self._matrix.key, tuple(self._rows.tolist()), self.method, float(self.regularization))
+
+    def _loadOrCalculateOperator(self) -> np.ndarray:
+        key = None
+        if self.diskCache is not None:
+            key = self._operatorKey()
+            data = self.diskCache.load(self.__class__.__name__, key)
+            if data is not None and data['operator'].shape == self._lgs_A.shape[::-1]:
+                return data['operator']
+
+        operator = self.calculateOperator(self._lgs_A.toarray(), self.regularization, self.method)
+
+        if self.diskCache is not None:
+            try:
+                self.diskCache.store(self.__class__.__name__, key, {'operator': operator})
+            except OSError as e:
+                print("Could not store reconstruction operator: %s" % e)
+        return operator
+
+    @staticmethod
+    def calculateOperator(A: np.ndarray, regularization: float, method: str = 'tikhonov') -> np.ndarray:
+        """ Returns the regularized pseudo inverse of the given dense matrix """
+        u, s, vt = np.linalg.svd(A, full_matrices=False)
+        if len(s) == 0 or s[0] <= 0:
+            return np.zeros(A.shape[::-1])
+        if method == 'tsvd':
+            factors = np.zeros_like(s)
+            keep = s >= regularization * s[0]
+            factors[keep] = 1 / s[keep]
+        else:
+            factors = s / (s ** 2 + (regularization * s[0]) ** 2)
+        return (vt.T * factors) @ u.T
@@ -1,10 +1,11 @@
-import math
+import numpy as np
 
+from .InfluenceMatrixModel import InfluenceMatrixModel
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...LightSkin import BackwardModel, LightSkin, Calibration
 
 
-class SimpleBackProjection(BackwardModel):
+class SimpleBackProjection(InfluenceMatrixModel, BackwardModel):
     """ Implements the back projection approach where the value is equally distributed along each ray """
 
     MIN_SENSITIVITY = 0.02
@@ -17,48 +18,32 @@ class SimpleBackProjection(BackwardModel):
                  calibration: Calibration,
                  ray_model: RayGridInfluenceModel):
         super().__init__(ls, gridWidth, gridHeight, calibration)
-        self._tmpGrid = []
-        self._tmpGridWeights = []
-        self.rayModel: RayGridInfluenceModel = ray_model
-        self.rayModel.gridDefinition = self.gridDefinition
+        self._initInfluenceMatrix(ray_model)
 
     def calculate(self) -> bool:
-
-        self._tmpGrid = self.gridDefinition.makeGridFilledWith(0.0)
-        self._tmpGridWeights = self.gridDefinition.makeGridFilledWith(0.0)
-
-        for i_l, l in enumerate(self.ls.LEDs):
-            for i_s, s in enumerate(self.ls.sensors):
-                val = self.ls.forwardModel.getSensorValue(i_s, i_l)
-                expectedVal = self.calibration.expectedSensorValue(i_s, i_l)
-                if expectedVal > self.MIN_SENSITIVITY:
-                    translucencyFactor = val / expectedVal
-                    self._backProject(i_s, i_l, translucencyFactor)
-
-        for i_l, (line, lineWeighs) in enumerate(zip(self._tmpGrid, self._tmpGridWeights)):
-            for i, w in enumerate(lineWeighs):
-                # we need to manipulate values
-                val = self.UNKNOWN_VAL
-                if w > 0:
-                    val = line[i] / w
-                # val = val ** 10
-                # Weighting the value by the knowledge we have
-                # To reduce "noise" in low-knowledge-areas
-                #val = self.UNKNOWN_VAL + (val - self.UNKNOWN_VAL) * (1 - 1 / (w * self.sampleDistance + 1))
-                line[i] = val
-
-        self.grid = self._tmpGrid
-
+        self.reconstructBatch(self._currentFrame()[np.newaxis])
         return True
 
-    def _backProject(self, sensor: int, led: int, factor: float):
-        ray = self.ls.getRayFromLEDToSensor(sensor, led)
-
-        cells = self.rayModel.getInfluencesForRay(ray)
-
-        dfactor = factor ** (1 / ray.length)
-
-        for (i, j), w in cells:
-            # weighted factorization
-            self._tmpGrid[i][j] += dfactor * w
-            self._tmpGridWeights[i][j] += w
+    def reconstructBatch(self, frames: np.ndarray) -> np.ndarray:
+        """ Back projects all frames at once: one sparse product with a column per frame """
+        matrix = self._updateInfluenceMatrix()
+
+        vals = self._rayArray(frames)
+        expectedVals = self.calibration.expectedSensorValues().ravel()
+        valid = expectedVals > self.MIN_SENSITIVITY
+
+        translucencyFactors = np.ones_like(vals)
+        np.divide(vals, expectedVals, out=translucencyFactors, where=valid)
+        dfactors = np.where(valid, translucencyFactors ** (1 / matrix.rayLengths), 0.0)
+
+        tmp = matrix.AT @ dfactors.T
+        weights = (matrix.AT @ valid.astype(float))[:, np.newaxis]
+        # Weighting the value by the knowledge we have would reduce "noise" in low-knowledge-areas:
+        # val = self.UNKNOWN_VAL + (val - self.UNKNOWN_VAL) * (1 - 1 / (w * self.sampleDistance + 1))
+        values = np.full_like(tmp, self.UNKNOWN_VAL)
+        np.divide(tmp, weights, out=values, where=weights > 0)
+
+        grids = matrix.toGrid(values.T)
+        if len(grids) > 0:
+            self.grid = grids[-1]
+        return grids
@@ -13,9 +13,10 @@ class SimpleDumbProportionalBackProjection(BackwardModel):
         for i in range(self.gridWidth):
             self.grid.append([1.0] * self.gridHeight)
 
+        frame = self._currentFrame()
         for i_l, l in enumerate(self.ls.LEDs):
             for i_s, s in enumerate(self.ls.sensors):
-                val = self.ls.forwardModel.getSensorValue(i_s, i_l)
+                val = frame[i_l][i_s]
                 expectedVal = self._expectedSensorValue(i_s, i_l)
                 if expectedVal > self.MIN_SENSITIVITY:
                     translucencyFactor = val / expectedVal
@@ -1,76 +1,87 @@
-import math
+from typing import Optional, Tuple
 
+import numpy as np
+
+from .IterativeBackProjection import IterativeBackProjection
 from .SimpleBackProjection import SimpleBackProjection
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...LightSkin import LightSkin, Calibration
 
 
-class SimpleRepeatedBackProjection(SimpleBackProjection):
+class SimpleRepeatedBackProjection(IterativeBackProjection, SimpleBackProjection):
     """ Improves on the back projection by iteratively calculating the expected values for the current reconstruction.
         The error to the actual measurement then once again gets backprojected.
-        This is repeated n times
+        This is repeated until the reconstruction converged, at most `repetitions` times:
+        when the map changes by less than `tolerance` (relative) in an iteration,
+        or the residual (RMS difference between measured and projected translucency factors of the rays)
+        is below `residualTolerance`. With a time budget (`maxTime`) it stops early with the map reached so far;
+        `iterations`, `residual` and `converged` tell how good it is.
+        Optionally (`warmStart`) the iterations start from the previous reconstruction.
+
+        Every iteration works on all rays at once (like SIRT): the current reconstruction is projected forward
+        with the influence matrix, and the factors between measurement and projection are projected back.
+        Batches of frames are reconstructed together, with one column per frame in all vectors.
     """
 
+    _MIN_TRANSLUCENCY_FACTOR = 1e-300
+    """ Lower bound of projected translucency factors, so fully opaque rays do not cause a division by zero """
+    _MIN_WARM_START = 0.001
+    """ Lower bound of the translucency of warm started cells; the updates are factors, so 0 could never recover """
+
     def __init__(self, ls: LightSkin,
                  gridWidth: int,
                  gridHeight: int,
                  calibration: Calibration,
                  ray_model: RayGridInfluenceModel,
-                 repetitions: int = 20):
+                 repetitions: int = 20,
+                 tolerance: float = 0.001,
+                 residual_tolerance: float = 0.0,
+                 max_time: float = None,
+                 warm_start: bool = False):
         super().__init__(ls, gridWidth, gridHeight, calibration, ray_model)
-        self._bufGrid = []
-        self.repetitions: int = repetitions
-
-    def calculate(self):
-
-        # reset internal buffer
-        self._bufGrid = self.gridDefinition.makeGridFilledWith(1.0)
-
-        for i in range(self.repetitions):
-            self._calculate_iteration()
-            print("Iteration %i" % i)
-
-        # update actual map
-        self.grid = self._bufGrid
-
-        return True
-
-    def _calculate_iteration(self):
-
-        self._tmpGrid = self.gridDefinition.makeGridFilledWith(0.0)
-        self._tmpGridWeights = self.gridDefinition.makeGridFilledWith(0.0)
-
-        for i_l, l in enumerate(self.ls.LEDs):
-            for i_s, s in enumerate(self.ls.sensors):
-                val = self.ls.forwardModel.getSensorValue(i_s, i_l)
-                expectedVal = self.calibration.expectedSensorValue(i_s, i_l)
-                if expectedVal > self.MIN_SENSITIVITY:
-                    translucencyFactor = val / expectedVal
-                    dFactor = translucencyFactor / self.__currentTranslucencyFactor(i_s, i_l)
-                    self._backProject(i_s, i_l, dFactor)
-
-        for i_l, (line, lineWeighs) in enumerate(zip(self._tmpGrid, self._tmpGridWeights)):
-            for i, w in enumerate(lineWeighs):
-                # we need to manipulate values
-                val = self.UNKNOWN_VAL
-                if w > 0:
-                    val = line[i] / w
-                # val = val ** 10
-                # Weighting the value by the knowledge we have
-                # To reduce "noise" in low-knowledge-areas
-                #val = self.UNKNOWN_VAL + (val - self.UNKNOWN_VAL) * (1 - 1 / (w * self.sampleDistance + 1))
-                line[i] = val
-                self._bufGrid[i_l][i] = max(0.0, min(1.0, self._bufGrid[i_l][i] * val))
-
-        return True
-
-    def __currentTranslucencyFactor(self, sensor: int, led: int) -> float:
-        ray = self.ls.getRayFromLEDToSensor(sensor, led)
-        cells = self.rayModel.getInfluencesForRay(ray)
-
-        translucencyMul = 1
-        for (i, j), w in cells:
-            # weighted factorization
-            translucencyMul *= self._bufGrid[i][j] ** w
-
-        return max(0.0, min(1.0, translucencyMul))
+        self._buf: np.ndarray = np.zeros((0, 1))
+        """ The reconstructions while they are being built; indexed by [column of the influence matrix][frame] """
+        self._initIterations(repetitions, tolerance, residual_tolerance, max_time, warm_start)
+
+    def _prepareRays(self, vals: np.ndarray):
+        """ Selects the rays to use with the current calibration and their measurements of the given frames,
+            indexed by [frame][ray] """
+        expectedVals = self._selectRays(self._updateInfluenceMatrix())
+        self._raysMeasured = (vals[:, self._rays] / expectedVals[self._rays]).T
+
+    def _initialBuffer(self, previous: Optional[np.ndarray]) -> np.ndarray:
+        if previous is None:
+            return np.ones(self._matrix.shape[1])
+        return np.maximum(previous, self._MIN_WARM_START)
+
+    def _bufferMap(self) -> np.ndarray:
+        return self._buf.copy()
+
+    def _calculate_iteration(self) -> np.ndarray:
+        current = self._projectedRays()
+        residuals = self._residuals(current)
+        np.maximum(current, self._MIN_TRANSLUCENCY_FACTOR, out=current)
+        tmp, weights = self._backProjectRays(self._raysMeasured / current)
+
+        # Weighting the value by the knowledge we have would reduce "noise" in low-knowledge-areas:
+        # val = self.UNKNOWN_VAL + (val - self.UNKNOWN_VAL) * (1 - 1 / (w * self.sampleDistance + 1))
+        values = np.full_like(tmp, self.UNKNOWN_VAL)
+        weights = weights[:, np.newaxis]
+        np.divide(tmp, weights, out=values, where=weights > 0)
+        np.clip(self._buf * values, 0.0, 1.0, out=self._buf)
+
+        return residuals
+
+    def _projectedRays(self) -> np.ndarray:
+        """ Returns the translucency factor of every used ray in the current reconstructions,
+            indexed by [ray][frame] """
+        # weighted factorization: prod(t ** w) = exp(sum(w * log(t)))
+        with np.errstate(divide='ignore'):
+            log_buf = np.log(self._buf)
+        return np.clip(np.exp(self._raysA @ log_buf), 0.0, 1.0)
+
+    def _backProjectRays(self, factors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Distributes the given factor of every used ray (indexed by [ray][frame]) onto its cells;
+            returns the weighted sum of the factors per cell and frame and the sum of the weights of every cell """
+        dfactors = factors ** (1 / self._matrix.rayLengths[self._rays])[:, np.newaxis]
+        return self._raysAT @ dfactors, self._raysAT @ np.ones(len(self._rays))
@@ -1,6 +1,9 @@
-from typing import List, Tuple
+from typing import Tuple
+
+import numpy as np
 
 from .SimpleRepeatedBackProjection import SimpleRepeatedBackProjection
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
 
 
 class SimpleRepeatedDistributeBackProjection(SimpleRepeatedBackProjection):
@@ -10,54 +13,55 @@ class SimpleRepeatedDistributeBackProjection(SimpleRepeatedBackProjection):
         This speeds up the converging of the result.
     """
 
-    def _backProject(self, sensor: int, led: int, factor: float):
-        ray = self.ls.getRayFromLEDToSensor(sensor, led)
-
-        cells = self.rayModel.getInfluencesForRay(ray)
-        """ cells that are open for the next round """
+    def _backProjectRays(self, factors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Distributes the factor of every ray onto its cells; cells reaching a value of 1 take no more,
+            the rest of the factor is spread onto the other cells of the ray.
+            This happens in rounds, like distributing the factor ray by ray would; but every round handles all
+            rays and frames at once, on the entries of the sparse matrix (indexed by [entry][frame]). """
+        A = self._raysA
+        ray_count = A.shape[0]
+        if self._raysEntries is None:
+            self._raysEntries = InfluenceMatrix.entryIndices(A)
+        entry_ray, entry_cell, ray_sum, cell_sum = self._raysEntries
+        entry_weight = A.data[:, np.newaxis]
+        entry_buf = self._buf[entry_cell]
 
-        rest_factor = factor
-        """ Factor that still needs to be distributed """
-        dfactor = 1.0
-        """ Factor per distance in the current iteration; factor currently applied to all cells that are left """
-        cells_left: List[Tuple[Tuple[int, int], float]] = []
-        """ Cells that can still take more factor """
-        cells_finished: List[Tuple[Tuple[int, int], float, float]] = []
-        """ Cells for which the resulting factor has already been calculated """
+        rest_factor = np.array(factors, dtype=float)
+        """ Factor that still needs to be distributed, per ray """
+        dfactor = np.ones_like(rest_factor)
+        """ Factor per distance in the current round; factor currently applied to all cells that are left """
+        entry_open = np.ones(entry_buf.shape, dtype=bool)
+        """ Entries (cells of a ray) that can still take more factor """
+        entry_factor = np.zeros(entry_buf.shape)
+        """ The resulting factor of the entries that are finished """
 
-        #print('Distributing %f into %i' % (rest_factor, len(cells)))
-        while (abs(1 - rest_factor) > .000001) and len(cells) > 0:
+        open_count = np.diff(A.indptr)[:, np.newaxis]
+        active = (np.abs(1 - rest_factor) > .000001) & (open_count > 0)
+        while active.any():
             # While there is still factor to be distributed and we still have cells that can take factor
+            entries = entry_open & active[entry_ray]
+            weight_sum = ray_sum @ (entry_weight * entries)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # total factor left = rest needed to be applied + factor currently applied on all cells still open
+                total_factor = rest_factor * dfactor ** weight_sum
+                dfactor = np.where(active, total_factor ** (1 / weight_sum), dfactor)
+            rest_factor[active] = 1.0
+
+            # max out at 1; cells can't take anymore; 'add up' their excess to the rest factor
+            entry_dfactor = dfactor[entry_ray]
+            finished = entries & (entry_buf * entry_dfactor > 1)
+            f = 1 / entry_buf[finished]
+            entry_factor[finished] = f
+            entry_open[finished] = False
+            excess = np.zeros(entry_buf.shape)
+            excess[finished] = np.log(entry_dfactor[finished] / f)
+            excess *= entry_weight
+            rest_factor *= np.exp(ray_sum @ excess)
+
+            open_count = ray_sum @ entry_open.astype(float)
+            active &= (np.abs(1 - rest_factor) > .000001) & (open_count > 0)
+
+        # all remaining cells get the current dfactor of their ray
+        entry_factor[entry_open] = dfactor[entry_ray][entry_open]
 
-            weight_sum = sum(map(lambda el: el[1], cells))
-            total_factor = rest_factor * (dfactor ** weight_sum)
-            """ total factor left =
-                rest_factor needed to be applied + factor currently applied on all cells that are still open
-            """
-            dfactor = total_factor ** (1 / weight_sum)
-            rest_factor = 1.0
-
-            for (i, j), w in cells:
-                if self._bufGrid[i][j] * dfactor > 1:  # max out at 1; cell can't take anymore
-                    #print('Doesnt fit cell %f %f' % (self._bufGrid[i][j] * dfactor, dfactor))
-                    f = 1 / self._bufGrid[i][j]
-                    # f is the maximum the cell can still take
-                    rest_factor *= (dfactor / f) ** w
-                    # 'add up' to the rest factor that still needs to be distributed
-                    cells_finished.append(((i, j), w, f))
-                    # The resulting factor for this cell has been determined; no more work needed
-                else:
-                    # add cell to list of cells that could potentially still take more factor
-                    cells_left.append(((i, j), w))
-
-            cells = cells_left
-            cells_left = []
-            #print('Still got stuff to distribute %f into %i' % (rest_factor, len(cells)))
-
-        # all remaining cells get the current dfactor
-        for (i, j), w in cells:
-            cells_finished.append(((i, j), w, dfactor))
-
-        for (i, j), w, f in cells_finished:
-            self._tmpGrid[i][j] += f * w
-            self._tmpGridWeights[i][j] += w
+        return cell_sum @ (entry_factor * entry_weight), self._raysAT @ np.ones(ray_count)
@@ -1,135 +1,124 @@
-import math
-from typing import List, Tuple
+from typing import Optional, Tuple
 
+import numpy as np
+
+from .InfluenceMatrixModel import InfluenceMatrixModel
+from .IterativeBackProjection import IterativeBackProjection
+from ..RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
 from ..RayInfluenceModels.RayInfluenceModel import RayGridInfluenceModel
 from ...LightSkin import LightSkin, Calibration, BackwardModel
 
 
-class SimpleRepeatedLogarithmicBackProjection(BackwardModel):
-    """ Almost equal to the SimpleRepeatedDistributeBackProjection but transferred to logarithmic space """
+class SimpleRepeatedLogarithmicBackProjection(IterativeBackProjection, InfluenceMatrixModel, BackwardModel):
+    """ Almost equal to the SimpleRepeatedDistributeBackProjection but transferred to logarithmic space.
+        Every iteration works on all rays at once: the current reconstruction is projected forward with the
+        influence matrix, and the differences to the measurement are projected back.
+        Iterates until the map changes by less than `tolerance` (relative) or the residual (RMS difference between
+        measured and projected translucency of the rays in log space) is below `residualTolerance`,
+        at most `repetitions` times or as long as the time budget `maxTime` allows.
+        Optionally (`warmStart`) the iterations start from the previous reconstruction.
+        Batches of frames are reconstructed together, with one column per frame in all vectors. """
     MIN_SENSITIVITY = 0.02
     UNKNOWN_VAL = 0.0
+    _MIN_TRANSLUCENCY = 0.000001
+    """ Lower bound of the measured translucency, so rays reading 0 do not lead to log(0) """
 
     def __init__(self, ls: LightSkin,
                  gridWidth: int,
                  gridHeight: int,
                  calibration: Calibration,
                  ray_model: RayGridInfluenceModel,
-                 repetitions: int = 20):
+                 repetitions: int = 20,
+                 tolerance: float = 0.001,
+                 residual_tolerance: float = 0.0,
+                 max_time: float = None,
+                 warm_start: bool = False):
         super().__init__(ls, gridWidth, gridHeight, calibration)
-        self._tmpGrid = []
-        self._tmpGridWeights = []
-        self._bufGrid: List[List[float]] = []
-        """ Contains the weights while they are being built in log space """
-        self.rayModel: RayGridInfluenceModel = ray_model
-        self.rayModel.gridDefinition = self.gridDefinition
-        self.repetitions: int = repetitions
-
-    def calculate(self):
-
-        # reset internal buffer
-        self._bufGrid = []
-        for i in range(self.gridDefinition.cellsX):
-            self._bufGrid.append([0.0] * self.gridDefinition.cellsY)
-
-        for i in range(self.repetitions):
-            self._calculate_iteration()
-            print("Iteration %i" % i)
-
-        # update actual map
-        for i, line in enumerate(self._bufGrid):
-            for j, c in enumerate(line):
-                # Actual grid is not in logarithm space but in normal
-                self.grid[i][j] = math.exp(self._bufGrid[i][j])
-                # print("Resulting value %i %i : %f" % (i, j, self.grid[i][j]))
-
-        return True
-
-    def _calculate_iteration(self):
-
-        self._tmpGrid = []
-        self._tmpGridWeights = []
-        for i in range(self.gridDefinition.cellsX):
-            self._tmpGrid.append([0.0] * self.gridDefinition.cellsY)
-            self._tmpGridWeights.append([0.0] * self.gridDefinition.cellsY)
-
-        for i_l, l in enumerate(self.ls.LEDs):
-            for i_s, s in enumerate(self.ls.sensors):
-                expected_val = self.calibration.expectedSensorValue(i_s, i_l)
-                if expected_val > self.MIN_SENSITIVITY:
-                    val = self.ls.forwardModel.getSensorValue(i_s, i_l)
-                    translucency = math.log(val / expected_val)
-                    d_translucency = translucency - self._currentBufTranslucency(i_s, i_l)
-                    self._backProject(i_s, i_l, d_translucency)
-
-        for i, (row, rowWeighs) in enumerate(zip(self._tmpGrid, self._tmpGridWeights)):
-            for j, w in enumerate(rowWeighs):
-                # we need to manipulate values
-                val = self.UNKNOWN_VAL
-                if w > 0:
-                    val = row[j] / w
-                row[j] = val
-                self._bufGrid[i][j] = min(0.0, self._bufGrid[i][j] + val)
-
-        return True
-
-    def _currentBufTranslucency(self, sensor: int, led: int) -> float:
-        ray = self.ls.getRayFromLEDToSensor(sensor, led)
-        cells = self.rayModel.getInfluencesForRay(ray)
-
-        translucency = 0
-        for (i, j), w in cells:
-            # weighted factorization
-            translucency += self._bufGrid[i][j] * w
-
-        return min(0.0, translucency)
-
-    def _backProject(self, sensor: int, led: int, translucency: float):
-        ray = self.ls.getRayFromLEDToSensor(sensor, led)
-
-        cells = self.rayModel.getInfluencesForRay(ray)
-        """ cells that are open for the next round """
-
-        rest_translucency = translucency
-        """ Translucency delta that still needs to be distributed """
-        d_transl = .0
-        """ translucency per distance in the current iteration;
+        self._buf: np.ndarray = np.zeros((0, 1))
+        """ Contains the weights while they are being built in log space; indexed by [column of the matrix][frame] """
+        self._initInfluenceMatrix(ray_model)
+        self._initIterations(repetitions, tolerance, residual_tolerance, max_time, warm_start)
+
+    def _prepareRays(self, vals: np.ndarray):
+        expected_vals = self._selectRays(self._updateInfluenceMatrix())
+        measured = np.maximum(vals[:, self._rays], self._MIN_TRANSLUCENCY)
+        self._raysMeasured = np.log(measured / expected_vals[self._rays]).T
+
+    def _initialBuffer(self, previous: Optional[np.ndarray]) -> np.ndarray:
+        return np.zeros(self._matrix.shape[1]) if previous is None else previous
+
+    def _bufferMap(self) -> np.ndarray:
+        # the actual map is not in logarithm space but in normal
+        return np.exp(self._buf)
+
+    def _calculate_iteration(self) -> np.ndarray:
+        current = self._projectedRays()
+        residuals = self._residuals(current)
+        d_translucency = self._raysMeasured - current
+        tmp, weights = self._backProjectRays(d_translucency)
+
+        values = np.full_like(tmp, self.UNKNOWN_VAL)
+        weights = weights[:, np.newaxis]
+        np.divide(tmp, weights, out=values, where=weights > 0)
+        np.minimum(self._buf + values, 0.0, out=self._buf)
+
+        return residuals
+
+    def _projectedRays(self) -> np.ndarray:
+        """ Returns the translucency of every used ray in the current reconstructions in log space,
+            indexed by [ray][frame] """
+        return np.minimum(self._raysA @ self._buf, 0.0)
+
+    def _backProjectRays(self, translucencies: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Distributes the translucency delta of every ray onto its cells; cells reaching 0 take no more,
+            the rest of the delta is spread onto the other cells of the ray.
+            This happens in rounds, like distributing the delta ray by ray would; but every round handles all
+            rays and frames at once, on the entries of the sparse matrix (indexed by [entry][frame]). """
+        A = self._raysA
+        ray_count = A.shape[0]
+        if self._raysEntries is None:
+            self._raysEntries = InfluenceMatrix.entryIndices(A)
+        entry_ray, entry_cell, ray_sum, cell_sum = self._raysEntries
+        entry_weight = A.data[:, np.newaxis]
+        entry_buf = self._buf[entry_cell]
+
+        rest_translucency = np.array(translucencies, dtype=float)
+        """ Translucency delta that still needs to be distributed, per ray """
+        d_transl = np.zeros_like(rest_translucency)
+        """ translucency per distance in the current round;
             translucency delta currently applied to all cells that are left """
-        cells_left: List[Tuple[Tuple[int, int], float]] = []
-        """ Cells that can still take more translucency """
-        cells_finished: List[Tuple[Tuple[int, int], float, float]] = []
-        """ Cells for which the resulting translucency delta has already been calculated """
-
-        while (abs(rest_translucency) > .00001) and len(cells) > 0:
+        entry_open = np.ones(entry_buf.shape, dtype=bool)
+        """ Entries (cells of a ray) that can still take more translucency """
+        entry_transl = np.zeros(entry_buf.shape)
+        """ The resulting translucency delta of the entries that are finished """
+
+        open_count = np.diff(A.indptr)[:, np.newaxis]
+        active = (np.abs(rest_translucency) > .00001) & (open_count > 0)
+        while active.any():
             # While there is still transl. to be distributed and we still have cells that can take transl
-
-            weight_sum = sum(map(lambda el: el[1], cells))
-            total_transl = rest_translucency + (d_transl * weight_sum)
-            """ total translucency left =
-                rest_translucency needed to be applied + translucency currently applied on all cells that are still open
-            """
-            d_transl = total_transl / weight_sum
-            rest_translucency = .0
-
-            for (i, j), w in cells:
-                if self._bufGrid[i][j] + d_transl > 0:  # max out at 0; cell can't take anymore
-                    t = -self._bufGrid[i][j]
-                    # t thus us the max the cell can still take
-                    rest_translucency += (d_transl - t) * w
-                    # 'add up' the remaining transl that still needs to be distributed
-                    cells_finished.append(((i, j), w, t))
-                    # The resulting transl. delta for this cell has been determined; no more work needed
-                else:
-                    # add cell to list of cells that could potentially still take more transl
-                    cells_left.append(((i, j), w))
-
-            cells = cells_left
-            cells_left = []
-
-        # all remaining cells get the current d_transl
-        for (i, j), w in cells:
-            cells_finished.append(((i, j), w, d_transl))
-
-        for (i, j), w, f in cells_finished:
-            self._tmpGrid[i][j] += f * w
-            self._tmpGridWeights[i][j] += w
+            entries = entry_open & active[entry_ray]
+            weight_sum = ray_sum @ (entry_weight * entries)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # total translucency left = rest needed to be applied + translucency applied on all open cells
+                total_transl = rest_translucency + d_transl * weight_sum
+                d_transl = np.where(active, total_transl / weight_sum, d_transl)
+            rest_translucency[active] = .0
+
+            # max out at 0; cells can't take anymore; 'add up' the remaining transl that still needs to be distributed
+            entry_d_transl = d_transl[entry_ray]
+            finished = entries & (entry_buf + entry_d_transl > 0)
+            t = -entry_buf[finished]
+            entry_transl[finished] = t
+            entry_open[finished] = False
+            excess = np.zeros(entry_buf.shape)
+            excess[finished] = entry_d_transl[finished] - t
+            excess *= entry_weight
+            rest_translucency += ray_sum @ excess
+
+            open_count = ray_sum @ entry_open.astype(float)
+            active &= (np.abs(rest_translucency) > .00001) & (open_count > 0)
+
+        # all remaining cells get the current d_transl of their ray
+        entry_transl[entry_open] = d_transl[entry_ray][entry_open]
+
+        return cell_sum @ (entry_transl * entry_weight), self._raysAT @ np.ones(ray_count)
@@ -0,0 +1,161 @@
+import time
+from typing import Optional
+
+import numpy as np
+from scipy.linalg import lapack
+import scipy.sparse as sparse
+
+
+class WarmStartNNLS:
+    """ Solves min ||Ax - b|| subject to x >= 0 for a sequence of b vectors and a mostly constant A.
+
+        Uses the active set method of Lawson and Hanson on the normal equations (as in the fast NNLS of Bro and
+        de Jong): the Gram matrix AᵀA is calculated once per matrix, so a frame only costs the product Aᵀb
+        and a few small dense solves; the Cholesky factor of the passive part is extended when a variable is added.
+        Every solve starts from the previous solution and its set of positive variables,
+        which usually is (almost) right for consecutive frames.
+
+        The number of iterations and the time per solve can be limited; the feasible solution reached until then
+        is returned in that case. Every iteration improves it, so it is a usable approximation.
+    """
+
+    def __init__(self, max_iterations: int = None, max_time: float = None):
+        self.maxIterations: Optional[int] = max_iterations
+        """ Maximal number of changes of the active set per solve; three times the number of variables if None """
+        self.maxTime: Optional[float] = max_time
+        """ Maximal time per solve in seconds; unlimited if None """
+
+        self.iterations: int = 0
+        """ Number of changes of the active set in the last solve """
+        self.converged: bool = False
+        """ Whether the last solve reached the optimum (and was not stopped by a limit) """
+
+        self._A: sparse.spmatrix = None
+        self._AT: sparse.csr_matrix = None
+        self._gram: np.ndarray = None
+        self._tolerance: float = 0.0
+        self._x: np.ndarray = None
+
+    def setMatrix(self, A: sparse.spmatrix):
+        """ Use the given matrix from now on; the Gram matrix is only calculated if it is a different one """
+        if A is self._A:
+            return
+        self._A = A
+        self._AT = sparse.csr_matrix(A.T)
+        self._gram = (self._AT @ A).toarray()
+        self._tolerance = 10 * np.finfo(float).eps * max(1.0, np.abs(self._gram).sum(axis=0).max()) * A.shape[1]
+        if self._x is not None and len(self._x) != A.shape[1]:
+            self._x = None
+
+    def reset(self):
+        """ Forget the previous solution; the next solve starts from scratch """
+        self._x = None
+
+    @property
+    def solution(self) -> Optional[np.ndarray]:
+        """ The solution the next solve starts from: the previous one unless set; None to start from scratch """
+        return self._x
+
+    @solution.setter
+    def solution(self, x: Optional[np.ndarray]):
+        self._x = None if x is None else np.maximum(np.asarray(x, dtype=float), 0.0)
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """ Returns the nonnegative least squares solution for the given b and the current matrix """
+        deadline = None if self.maxTime is None else time.perf_counter() + self.maxTime
+        gram = self._gram
+        c = self._AT @ np.asarray(b, dtype=float)
+        n = len(c)
+        tol = self._tolerance
+        max_iterations = 3 * n if self.maxIterations is None else self.maxIterations
+
+        x = np.zeros(n) if self._x is None else self._x.copy()
+        passive = x > 0
+        indices = np.flatnonzero(passive)
+        factor = self._factorize(gram, indices)
+        self.iterations = 0
+        self.converged = False
+
+        while True:
+            # find the optimum on the passive set; move back into the feasible region where it leaves it
+            while len(indices) > 0:
+                s = np.zeros(n)
+                s[indices] = self._solvePassive(gram, c, indices, factor)
+                if s[indices].min() > tol:
+                    x = s
+                    break
+                self.iterations += 1
+                blocking = indices[s[indices] <= tol]
+                alpha = np.min(x[blocking] / (x[blocking] - s[blocking]))
+                x += alpha * (s - x)
+                passive &= x > tol
+                x[~passive] = 0.0
+                indices = np.flatnonzero(passive)
+                factor = self._factorize(gram, indices)
+                if self._limitReached(max_iterations, deadline):
+                    self._x = x
+                    return x
+
+            # add the variable improving the objective most
+            w = c - gram @ x
+            w[passive] = -np.inf
+            while True:
+                j = int(np.argmax(w))
+                if w[j] <= tol:
+                    self.converged = True
+                    self._x = x
+                    return x
+                if self._limitReached(max_iterations, deadline):
+                    self._x = x
+                    return x
+                extended = self._extendFactor(gram, indices, factor, j)
+                if extended is not None:
+                    break
+                # linearly dependent on the passive variables; can not improve the solution
+                w[j] = -np.inf
+            factor = extended
+            indices = np.append(indices, j)
+            passive[j] = True
+            self.iterations += 1
+
+    def _limitReached(self, max_iterations: int, deadline: Optional[float]) -> bool:
+        if self.iterations >= max_iterations:
+            return True
+        return deadline is not None and time.perf_counter() >= deadline
+
+    @staticmethod
+    def _factorize(gram: np.ndarray, indices: np.ndarray) -> Optional[np.ndarray]:
+        """ Returns the lower Cholesky factor of the Gram matrix restricted to the given variables;
+            None if there are none or it is singular """
+        if len(indices) == 0:
+            return None
+        factor, info = lapack.dpotrf(gram[np.ix_(indices, indices)], lower=1, clean=1)
+        return factor if info == 0 else None
+
+    @staticmethod
+    def _extendFactor(gram: np.ndarray, indices: np.ndarray, factor: Optional[np.ndarray], j: int) \
+            -> Optional[np.ndarray]:
+        """ Returns the Cholesky factor with the variable j added to the given ones;
+            None if j is linearly dependent on them """
+        k = len(indices)
+        if k > 0 and factor is None:
+            return None
+        v = lapack.dtrtrs(factor, gram[indices, j], lower=1)[0] if k > 0 else np.zeros(0)
+        d2 = gram[j, j] - v @ v
+        if d2 <= 1e-10 * gram[j, j]:
+            return None
+        extended = np.zeros((k + 1, k + 1))
+        if k > 0:
+            extended[:k, :k] = factor
+            extended[k, :k] = v
+        extended[k, k] = np.sqrt(d2)
+        return extended
+
+    @staticmethod
+    def _solvePassive(gram: np.ndarray, c: np.ndarray, indices: np.ndarray, factor: Optional[np.ndarray]) \
+            -> np.ndarray:
+        """ Solves the normal equations restricted to the given variables """
+        if factor is not None:
+            return lapack.dpotrs(factor, c[indices], lower=1)[0]
+        # singular if the passive columns are linearly dependent
+        return np.linalg.lstsq(gram[np.ix_(indices, indices)], c[indices], rcond=None)[0]
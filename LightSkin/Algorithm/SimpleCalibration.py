@@ -1,36 +1,87 @@
-from functools import reduce
-from typing import List
+import numpy as np
 
 from ..LightSkin import LightSkin, Calibration
 
 
 class SimpleCalibration(Calibration):
-    """ A simple calibration that takes a snapshot of sensor values as the calibration values """
+    """ A simple calibration that averages a number of frames of sensor values as the calibration values.
 
-    def __init__(self, ls: LightSkin):
+        Every call of `calibrate` adds the current frame of the skins default forward model to a running
+        mean and variance (Welford); once `frames` frames are collected, their mean becomes the calibration.
+        Until then the previous calibration (if any) stays in use.
+    """
+
+    def __init__(self, ls: LightSkin, frames: int = 1):
         super().__init__(ls)
+        self.frames: int = max(1, frames)
+        """ Number of frames to average per calibration """
         self.isCalibrated = False
-        self._calibration: List[List[float]] = []
-
-    def __current_hash__(self):
-        """ Returns a hash of the current calibration status """
-        calib_hash = reduce(
-            lambda h, l: hash((h,
-                               reduce(
-                                   lambda h2, el: hash((h2, el)),
-                                   l, 0))),
-            self._calibration, 0)
-        return hash((super().current_hash(), calib_hash))
+
+        self._calibration: np.ndarray = np.zeros((0, 0))
+        """ The expected sensor values, indexed by [led][sensor]; replaced (never modified) on calibration """
+        self._logCalibration: np.ndarray = self._calibration
+        self._variance: np.ndarray = self._calibration
+
+        self._count: int = 0
+        self._mean: np.ndarray = None
+        self._m2: np.ndarray = None
+
+    @property
+    def framesCollected(self) -> int:
+        """ Number of frames collected for the calibration in progress """
+        return self._count
+
+    @property
+    def variance(self) -> np.ndarray:
+        """ The sample variance of every sensor value over the frames of the current calibration,
+            indexed by [led][sensor]; zero if it was made from a single frame """
+        return self._variance
 
     def calibrate(self):
-        """ Apply the values currently available in the skins default forward model as calibration values """
-        self._calibration: List[List[float]] = []
-        for i in range(len(self.ls.LEDs)):
-            self._calibration.append([])
-            for j in range(len(self.ls.sensors)):
-                self._calibration[i].append(self.ls.forwardModel.getSensorValue(j, i))
+        """ Add the values currently available in the skins default forward model to the calibration """
+        self.addFrame(self.ls.forwardModel.getAllSensorValues())
+
+    def addFrame(self, values: np.ndarray):
+        """ Add a frame of sensor values, indexed by [led][sensor], to the calibration in progress """
+        values = np.asarray(values, dtype=float)
+        if self._mean is None or self._mean.shape != values.shape:
+            self.reset()
+            self._mean = np.zeros(values.shape)
+            self._m2 = np.zeros(values.shape)
+
+        self._count += 1
+        delta = values - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (values - self._mean)
+
+        if self._count >= self.frames:
+            self._apply()
+
+    def reset(self):
+        """ Discard the frames collected for the calibration in progress """
+        self._count = 0
+        self._mean = None
+        self._m2 = None
+
+    def _apply(self):
+        calibration = self._mean
+        calibration.flags.writeable = False
+        with np.errstate(divide='ignore'):
+            log_calibration = np.log(calibration)
+        log_calibration.flags.writeable = False
+        variance = self._m2 / (self._count - 1) if self._count > 1 else np.zeros_like(self._m2)
+        variance.flags.writeable = False
+
+        self._calibration, self._logCalibration, self._variance = calibration, log_calibration, variance
         self.isCalibrated = True
-        pass
+        self._version += 1
+        self.reset()
 
     def expectedSensorValue(self, sensor: int, led: int) -> float:
-        return self._calibration[led][sensor]
+        return float(self._calibration[led][sensor])
+
+    def expectedSensorValues(self) -> np.ndarray:
+        return self._calibration
+
+    def logExpectedSensorValues(self) -> np.ndarray:
+        return self._logCalibration
@@ -42,6 +42,7 @@ class LightSkinGridView(tk.Frame):
             if i == self.skin.selectedLED:
                 c = self._LEDColorS
             b.configure(bg=c)
+        vals = self.skin.forwardModel.getAllSensorValues()
         for i, l in enumerate(self._measurements):
             for j, (f, tt) in enumerate(l):
                 c = self._Color
@@ -49,7 +50,7 @@ class LightSkinGridView(tk.Frame):
                     c = self._LEDColorS
                 if j == self.skin.selectedSensor:
                     c = self._SensorColorS
-                val = self.skin.forwardModel.getSensorValue(j, i)
+                val = vals[i][j]
                 col = self.displayFunction(val)
                 f.configure(highlightbackground=c, bg=col.toHex())
                 tt.text = "%.2f%%" % (val*100)
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Hashable, TypeVar
+
+V = TypeVar('V')
+
+
+class BoundedCache:
+    """ A cache holding at most `capacity` entries; counts hits, misses and evictions.
+        Evicts the least recently used entry. Other eviction policies can be implemented by overriding `_touch`.
+        A capacity of None means unbounded, 0 disables caching. """
+
+    def __init__(self, capacity: int = 512):
+        self.capacity: int = capacity
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, compute: Callable[[], V]) -> V:
+        """ Returns the cached value for the key; calculates and stores it using `compute` if not available """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._touch(key)
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            if self.capacity != 0:
+                self._entries[key] = value
+                while self.capacity is not None and len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def _touch(self, key: Hashable):
+        """ Called on every hit; moves the entry to the end of the eviction order """
+        self._entries.move_to_end(key)
+
+    def clear(self):
+        """ Drops all entries; statistics are kept """
+        with self._lock:
+            self._entries.clear()
+
+    def resetStatistics(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def statistics(self) -> Dict[str, int]:
+        """ Returns the current counters, the number of entries and the capacity """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'capacity': self.capacity,
+        }
+
+
+class FIFOCache(BoundedCache):
+    """ A bounded cache evicting the oldest entry, regardless of how often it was used """
+
+    def _touch(self, key: Hashable):
+        pass
@@ -0,0 +1,50 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class DiskCache:
+    """ Stores sets of named arrays as .npz files in a directory.
+        Entries are identified by a name and a stable hash of a key made of plain values (numbers, strings, tuples). """
+
+    VERSION = 1
+    """ Part of every key; increase when the format of stored entries changes """
+
+    def __init__(self, directory: str):
+        self.directory: str = directory
+
+    @classmethod
+    def keyHash(cls, key) -> str:
+        """ Returns a hash of the given key that is stable between processes """
+        return hashlib.sha1(repr((cls.VERSION, key)).encode('utf-8')).hexdigest()
+
+    def path(self, name: str, key) -> str:
+        """ Returns the file used for the entry with the given name and key """
+        return os.path.join(self.directory, '%s-%s.npz' % (name, self.keyHash(key)))
+
+    def load(self, name: str, key) -> Optional[Dict[str, np.ndarray]]:
+        """ Returns the stored arrays or None if there is no (readable) entry """
+        path = self.path(name, key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return {k: data[k] for k in data.files}
+        except Exception as e:
+            print("Could not read cache entry %s: %s" % (path, e))
+            return None
+
+    def store(self, name: str, key, arrays: Dict[str, np.ndarray]):
+        """ Stores the given arrays; the file is replaced atomically so concurrent readers never see partial data """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self.path(name, key))
+        except Exception:
+            os.remove(tmp)
+            raise
@@ -0,0 +1,105 @@
+from threading import Condition, Thread
+from typing import Any, Callable
+
+import numpy as np
+
+
+class FrameMailbox:
+    """ Hands frames from a producer thread to a consumer thread; the latest frame wins.
+        Holds at most one pending frame besides the one the consumer is working on:
+        a frame put while another one is still pending replaces it and is counted as dropped. """
+
+    def __init__(self):
+        self._pending: Any = None
+        self._condition = Condition()
+        self._closed = False
+        self.framesPut: int = 0
+        self.framesTaken: int = 0
+        self.framesDropped: int = 0
+
+    def put(self, frame: Any):
+        """ Offer a new frame; never blocks """
+        with self._condition:
+            if self._pending is not None:
+                self.framesDropped += 1
+            self._pending = frame
+            self.framesPut += 1
+            self._condition.notify()
+
+    def take(self, timeout: float = None) -> Any:
+        """ Returns the newest frame not taken yet; waits for one if necessary.
+            Returns None on timeout or if the mailbox has been closed. """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending is not None or self._closed, timeout):
+                return None
+            frame = self._pending
+            self._pending = None
+            if frame is not None:
+                self.framesTaken += 1
+            return frame
+
+    def close(self):
+        """ Wakes up all waiting consumers; no more frames are returned afterwards """
+        with self._condition:
+            self._closed = True
+            self._pending = None
+            self._condition.notify_all()
+
+
+class LatestFrameWorker:
+    """ Decouples handling frames from receiving them:
+        Every onUpdate of the forward model puts its current frame into a FrameMailbox;
+        the handler runs in its own thread and always gets the newest frame.
+        Frames arriving while the handler is busy are dropped instead of piling up.
+        The mailbox gets a copy of the frame: the values of a streaming forward model are views into its ring
+        buffer, which are overwritten once enough newer frames arrived. """
+
+    def __init__(self, forward_model, handler: Callable[[np.ndarray], None]):
+        """ forward_model needs to provide an onUpdate EventHook, like the ArduinoConnectorForwardModel """
+        self.forwardModel = forward_model
+        self.handler: Callable[[np.ndarray], None] = handler
+        self.mailbox: FrameMailbox = FrameMailbox()
+        self.frameSequence: int = -1
+        """ Sequence number of the frame the handler is working on (see FrameRingBuffer) """
+
+        self._workerThreadRun = True
+        self._workerThread = Thread(target=self._workLoop, daemon=True)
+        self._workerThread.start()
+        self.forwardModel.onUpdate += self._onUpdate
+
+    def __del__(self):
+        self.stop()
+
+    @property
+    def droppedFrames(self) -> int:
+        """ Number of frames that were never handled because a newer one arrived first """
+        return self.mailbox.framesDropped
+
+    @property
+    def handledFrames(self) -> int:
+        return self.mailbox.framesTaken
+
+    def _onUpdate(self):
+        frames = getattr(self.forwardModel, 'frames', None)
+        sequence = frames.latestSequence if frames is not None else self.mailbox.framesPut
+        self.mailbox.put((sequence, np.array(self.forwardModel.getAllSensorValues())))
+
+    def _workLoop(self):
+        while self._workerThreadRun:
+            taken = self.mailbox.take(timeout=0.5)
+            if taken is None:
+                continue
+            self.frameSequence, frame = taken
+            try:
+                self.handler(frame)
+            except Exception as e:
+                print("Exception when handling frame")
+                print(e)
+
+    def stop(self):
+        """ Stop handling frames; waits for the handler to finish the current one """
+        if self._workerThreadRun:
+            self._workerThreadRun = False
+            self.forwardModel.onUpdate -= self._onUpdate
+            self.mailbox.close()
+            self._workerThread.join()
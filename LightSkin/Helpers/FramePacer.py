@@ -0,0 +1,36 @@
+import time
+
+
+class FramePacer:
+    """ Paces a loop emitting frames at a fixed rate (frames per second).
+
+        The schedule advances by exactly one period per frame, however long the frame took, so small delays
+        (e.g. sleeping a bit too long) are made up by the following frames instead of lowering the rate.
+        Only if the loop falls more than one period behind, the schedule restarts from the current time
+        instead of catching up with a burst of frames; these frames are counted as late.
+    """
+
+    def __init__(self):
+        self.startTime: float = 0.0
+        """ time.perf_counter() when the schedule started """
+        self.frameTime: float = 0.0
+        """ time.perf_counter() the current frame was scheduled for """
+        self.lateFrames: int = 0
+        """ Number of frames the schedule could not be kept for """
+
+    def start(self):
+        """ Starts the schedule with a frame now """
+        self.startTime = time.perf_counter()
+        self.frameTime = self.startTime
+
+    def waitNext(self, rate: float):
+        """ Waits until the next frame is due at the given rate """
+        period = 1 / rate
+        self.frameTime += period
+        now = time.perf_counter()
+        if now - self.frameTime > period:
+            # too far behind; don't try to catch up by emitting a burst of frames
+            self.lateFrames += 1
+            self.frameTime = now
+        elif self.frameTime > now:
+            time.sleep(self.frameTime - now)
@@ -0,0 +1,103 @@
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    """ A preallocated ring buffer holding the last `capacity` frames with timestamps and sequence numbers.
+
+        Meant for one writer thread and any number of reader threads, without locks:
+        Readers get read-only views into the buffer, which stay intact until the slot is reused `capacity` frames later.
+        While a slot is written its sequence number is invalid, so a reader can check with `isValid`
+        whether the frame it worked on was overwritten in the meantime.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], capacity: int = 64, dtype=float):
+        self.capacity: int = capacity
+        self._frames: np.ndarray = np.zeros((capacity,) + tuple(shape), dtype=dtype)
+        self._timestamps: np.ndarray = np.zeros(capacity)
+        self._sequences: np.ndarray = np.full(capacity, -1, dtype=np.int64)
+        self._next: int = 0
+        """ Sequence number of the next frame """
+        self._views = [frame.view() for frame in self._frames]
+        """ One read-only view per slot, so the same frame is always returned as the same object """
+        for view in self._views:
+            view.flags.writeable = False
+
+    def __len__(self):
+        return min(self._next, self.capacity)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """ Shape of a single frame """
+        return self._frames.shape[1:]
+
+    @property
+    def latestSequence(self) -> int:
+        """ Sequence number of the newest frame; -1 if there is none yet """
+        return self._next - 1
+
+    def beginWrite(self) -> np.ndarray:
+        """ Returns the slot for the next frame to be written into directly; finish with `commitWrite` """
+        slot = self._next % self.capacity
+        self._sequences[slot] = -1
+        return self._frames[slot]
+
+    def commitWrite(self, timestamp: float = None) -> int:
+        """ Publishes the frame written into the slot returned by `beginWrite`; returns its sequence number.
+            The timestamp defaults to time.perf_counter() """
+        seq = self._next
+        slot = seq % self.capacity
+        self._timestamps[slot] = time.perf_counter() if timestamp is None else timestamp
+        self._sequences[slot] = seq
+        self._next = seq + 1
+        return seq
+
+    def push(self, frame: np.ndarray, timestamp: float = None) -> int:
+        """ Copies the given frame into the buffer; returns its sequence number """
+        np.copyto(self.beginWrite(), frame)
+        return self.commitWrite(timestamp)
+
+    def isValid(self, seq: int) -> bool:
+        """ Whether the frame with the given sequence number is (still) available """
+        return seq >= 0 and self._sequences[seq % self.capacity] == seq
+
+    def get(self, seq: int) -> Optional[np.ndarray]:
+        """ Returns a read-only view of the frame with the given sequence number or None if it is not available """
+        slot = seq % self.capacity
+        if seq < 0 or self._sequences[slot] != seq:
+            return None
+        return self._views[slot]
+
+    def timestamp(self, seq: int) -> Optional[float]:
+        """ Returns the timestamp of the frame with the given sequence number or None if it is not available """
+        slot = seq % self.capacity
+        t = float(self._timestamps[slot])
+        return t if seq >= 0 and self._sequences[slot] == seq else None
+
+    def latest(self) -> Optional[np.ndarray]:
+        """ Returns a read-only view of the newest frame or None if there is none yet """
+        while self._next > 0:
+            view = self.get(self.latestSequence)
+            if view is not None:
+                return view
+            # overwritten while reading; try the now newest one
+        return None
+
+    def window(self, count: int, out: np.ndarray = None) -> np.ndarray:
+        """ Returns the last `count` frames, oldest first, as array of shape (count, *shape).
+            A view into the buffer if the frames are stored in one piece; otherwise they are copied into `out`
+            (allocated if not given). """
+        count = min(count, len(self))
+        end = self._next % self.capacity or self.capacity
+        if count <= end:
+            view = self._frames[end - count:end].view()
+            view.flags.writeable = False
+            return view
+        if out is None:
+            out = np.empty((count,) + self.shape, dtype=self._frames.dtype)
+        first = count - end
+        out[:first] = self._frames[self.capacity - first:]
+        out[first:count] = self._frames[:end]
+        return out[:count]
@@ -1,9 +1,10 @@
 #!/usr/bin/python3
 from functools import lru_cache
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from abc import ABC, abstractmethod
 
 import math
+import numpy as np
 
 from .Algorithm.RayInfluenceModels.RayInfluenceModel import Ray
 from .Helpers.EventHook import EventHook
@@ -29,6 +30,9 @@ class LightSkin:
         self.backwardModel: BackwardModel = None
         """ The default backward model to use """
 
+        self._geometry: Tuple = None
+        self._geometryVersion: int = 0
+
         self._selectedSensor: int = -1
         self._selectedLED: int = -1
         self.onChange: EventHook[[str, int, int]] = EventHook()
@@ -58,6 +62,17 @@ class LightSkin:
         self._selectedLED = i
         self.onChange('led', old, i)
 
+    @property
+    def geometryVersion(self) -> int:
+        """ A counter that is increased whenever the positions of the sensors or LEDs changed;
+            allows models to find out cheaply whether data derived from the geometry is still valid """
+        geometry = (tuple(self.LEDs), tuple(self.sensors))
+        if geometry != self._geometry:
+            self._geometry = geometry
+            self._geometryVersion += 1
+            self.getRayFromLEDToSensor.cache_clear()
+        return self._geometryVersion
+
     def getGridArea(self) -> ValueGridAreaDefinition:
         """ Returns the default area definition for the setup; spans all sensors and LEDs """
         min_x, min_y, max_x, max_y = self._findMinMaxPos()
@@ -110,6 +125,14 @@ class ForwardModel(Measurable):
         s = self.ls.sensors[sensor]
         return self.measureLEDAtPoint(s[0], s[1], led)
 
+    def getAllSensorValues(self) -> np.ndarray:
+        """ Returns the current values of all sensors for all LEDs (one frame) as an array indexed by [led][sensor].
+            The returned array must not be modified. """
+        leds = len(self.ls.LEDs)
+        sensors = len(self.ls.sensors)
+        return np.array([[self.getSensorValue(s, l) for s in range(sensors)] for l in range(leds)],
+                        dtype=float).reshape(leds, sensors)
+
     pass
 
 
@@ -117,6 +140,12 @@ class Calibration(ABC):
     """ A calibration defining the expected sensor value when no pressure is applied """
     def __init__(self, ls: LightSkin):
         self.ls: LightSkin = ls
+        self._version: int = 0
+
+    @property
+    def version(self) -> int:
+        """ A counter that is increased whenever the expected sensor values changed """
+        return self._version
 
     def current_hash(self):
         return self.__hash__()
@@ -128,6 +157,19 @@ class Calibration(ABC):
     def expectedSensorValue(self, sensor: int, led: int) -> float:
         raise NotImplementedError("Method not yet implemented")
 
+    def expectedSensorValues(self) -> np.ndarray:
+        """ Returns the expected values of all sensors for all LEDs as an array indexed by [led][sensor].
+            The returned array must not be modified. """
+        leds = len(self.ls.LEDs)
+        sensors = len(self.ls.sensors)
+        return np.array([[self.expectedSensorValue(s, l) for s in range(sensors)] for l in range(leds)],
+                        dtype=float).reshape(leds, sensors)
+
+    def logExpectedSensorValues(self) -> np.ndarray:
+        """ Returns the natural logarithm of expectedSensorValues(); -inf where a value is 0 """
+        with np.errstate(divide='ignore'):
+            return np.log(self.expectedSensorValues())
+
 
 class BackwardModel(ValueMap):
     """ An algorithm that provides functionality to reconstruct the translucency map given the skin and a calibration. """
@@ -136,11 +178,65 @@ class BackwardModel(ValueMap):
         super().__init__(ls.getGridArea(), gridWidth, gridHeight)
         self.ls: LightSkin = ls
         self.calibration: Calibration = calibration
+        self._frame: Optional[np.ndarray] = None
+        """ The frame to reconstruct instead of the current one of the forward model (see calculateFrame) """
 
     @abstractmethod
     def calculate(self) -> bool:
         """ Apply the backward model and calculate the expected values for the grid elements using the sensor values
-        retrieved from the skins forward model """
+        retrieved from the skins forward model; implementations get them from _currentFrame() """
         raise NotImplementedError("Method not yet implemented")
 
+    def calculateChanged(self, rays: np.ndarray) -> bool:
+        """ Updates the reconstruction for the current frame, given that only the given rays changed since the last
+            calculation; rays are numbered LED by LED (`led * sensorCount + sensor`).
+            Models that can restrict the update to the cells covered by these rays override this;
+            the default calculates everything again. """
+        return self.calculate()
+
+    def calculateFrame(self, frame: np.ndarray, rays: np.ndarray = None) -> bool:
+        """ Like calculate() (or calculateChanged(rays) if rays are given), but for the given frame of sensor values
+            (indexed by [led][sensor]) instead of the current one of the forward model.
+            The skin and its forward model are not touched, so a live source may stay attached meanwhile. """
+        self._frame = self._frameArray(np.asarray(frame)[np.newaxis])[0]
+        try:
+            return self.calculate() if rays is None else self.calculateChanged(rays)
+        finally:
+            self._frame = None
+
+    def reconstructBatch(self, frames: np.ndarray) -> np.ndarray:
+        """ Reconstructs the translucency maps of several frames at once.
+            frames is an array of sensor values indexed by [frame][led][sensor],
+            the result an array of maps indexed by [frame][i][j]. The grid is left with the map of the last frame.
+
+            This default calculates the frames one after another with calculateFrame();
+            models that can handle all frames in one go override it. """
+        frames = self._frameArray(frames)
+        grids = np.empty((len(frames), self.gridDefinition.cellsX, self.gridDefinition.cellsY))
+        for t, frame in enumerate(frames):
+            self.calculateFrame(frame)
+            grids[t] = self.grid
+        return grids
+
+    def _currentFrame(self) -> np.ndarray:
+        """ Returns the sensor values to reconstruct, indexed by [led][sensor]: the frame given to calculateFrame,
+            otherwise the current values of the skins forward model """
+        if self._frame is not None:
+            return self._frame
+        return self.ls.forwardModel.getAllSensorValues()
+
+    def _frameArray(self, frames: np.ndarray) -> np.ndarray:
+        """ Checks the shape of the given frames (indexed by [frame][led][sensor]) and returns them as float array """
+        frames = np.asarray(frames, dtype=float)
+        shape = (len(self.ls.LEDs), len(self.ls.sensors))
+        if frames.ndim != 3 or frames.shape[1:] != shape:
+            raise ValueError("Expected frames of shape (T, %i, %i), got %s" % (shape + (frames.shape,)))
+        return frames
+
+    def _rayArray(self, frames: np.ndarray) -> np.ndarray:
+        """ Returns the given frames (indexed by [frame][led][sensor]) as float array indexed by [frame][ray],
+            with the rays ordered LED by LED like the rows of the InfluenceMatrix """
+        frames = self._frameArray(frames)
+        return frames.reshape(len(frames), frames.shape[1] * frames.shape[2])
+
     pass
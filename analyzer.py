@@ -8,6 +8,8 @@ import tkinter as tk
 from LightSkin.Algorithm.Analyze.SensitivityMap import SensitivityMap
 from LightSkin.Algorithm.RayInfluenceModels.DirectSampledRayGridInfluenceModel import DirectSampledRayGridInfluenceModel
 from LightSkin.Algorithm.RayInfluenceModels.WideRayGridInfluenceModel import WideRayGridInfluenceModel
+from LightSkin.Algorithm.RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
+from LightSkin.Helpers.DiskCache import DiskCache
 from LightSkin.LightSkin import LightSkin, ValueMap
 from LightSkin.GUI import Views
 
@@ -25,6 +27,8 @@ def transposed(lists):
 
 # Main Code
 
+InfluenceMatrix.diskCache = DiskCache('cache')
+
 ls = LightSkin()
 
 # LOAD Sensor and LED coordinates from CSV
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+import argparse
+import time
+
+import numpy as np
+
+from LightSkin.Algorithm.ForwardModels.ArduinoConnectorForwardModel import ArduinoConnectorForwardModel
+from LightSkin.Algorithm.ForwardModels.FakeArduino import FakeArduino
+from LightSkin.LightSkin import LightSkin
+
+
+parser = argparse.ArgumentParser(description='Measures the throughput of the Arduino connector using a fake Arduino')
+parser.add_argument('--rate', type=float, default=1000.0, help='frames per second sent by the fake Arduino')
+parser.add_argument('--noise', type=float, default=0.01, help='standard deviation of the sensor noise')
+parser.add_argument('--leds', type=int, default=12, help='number of LEDs')
+parser.add_argument('--sensors', type=int, default=12, help='number of sensors')
+parser.add_argument('--binary', action='store_true', help='use the binary instead of the text protocol')
+parser.add_argument('--duration', type=float, default=5.0, help='seconds to run')
+args = parser.parse_args()
+
+# Main Code
+
+# only the number of LEDs and sensors matters to the connector
+ls = LightSkin()
+ls.LEDs = [(float(i), 0.0) for i in range(args.leds)]
+ls.sensors = [(float(i), 1.0) for i in range(args.sensors)]
+
+fake = FakeArduino(args.leds, args.sensors, rate=args.rate, noise=args.noise, binary=args.binary, autostart=False)
+print('Fake Arduino on %s' % fake.port)
+
+connector = ArduinoConnectorForwardModel(ls, fake.port, 1000000, verbose=False)
+ls.forwardModel = connector
+
+receiveTimes = []
+
+
+def onUpdate():
+    receiveTimes.append(time.perf_counter())
+
+
+connector.onUpdate += onUpdate
+
+fake.start()
+time.sleep(args.duration)
+fake.stop()
+time.sleep(0.5)  # let the connector catch up
+
+received = len(receiveTimes)
+sent = len(fake.sendTimes)
+# frames arrive in order; matching by position is valid as long as none got lost
+latencies = (np.array(receiveTimes) - np.array(fake.sendTimes[:received])) * 1000
+
+print("Protocol:         %s" % ('binary' if args.binary else 'text'))
+print("Frames:           %i sent / %i received / %i checksum errors" % (sent, received, connector.checksumErrors))
+print("Sent rate:        %.1f frames/s" % (sent / args.duration))
+print("Received rate:    %.1f frames/s" % (received / args.duration))
+if received > 0:
+    print("Parse time:       %.1f us per frame" % (connector.parseTime / received * 1e6))
+    print("Latency:          mean %.3f ms / p50 %.3f ms / p99 %.3f ms / max %.3f ms" % (
+        latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max()))
+if received != sent:
+    print("Frames were lost; latencies are not reliable")
+
+fake.close()
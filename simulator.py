@@ -9,6 +9,8 @@ from LightSkin.Algorithm.RayInfluenceModels.DirectSampledRayGridInfluenceModel i
 from LightSkin.Algorithm.Reconstruction.LogarithmicLinSysOptimize2 import LogarithmicLinSysOptimize2
 from LightSkin.Algorithm.Reconstruction.SimpleRepeatedDistributeBackProjection import SimpleRepeatedDistributeBackProjection
 from LightSkin.Algorithm.Reconstruction.SimpleRepeatedLogarithmicBackProjection import SimpleRepeatedLogarithmicBackProjection
+from LightSkin.Algorithm.RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
+from LightSkin.Helpers.DiskCache import DiskCache
 from LightSkin.LightSkin import LightSkin, ValueMap
 from LightSkin.GUI import Views
 
@@ -27,6 +29,8 @@ def transposed(lists):
 
 # Main Code
 
+InfluenceMatrix.diskCache = DiskCache('cache')
+
 ls = LightSkin()
 
 # LOAD Sensor and LED coordinates from CSV
@@ -81,11 +85,13 @@ start_time = time.time()
 repeated.calculate()
 t = time.time() - start_time
 print("Total time needed for calculation: %f " % t)
+print("Iterations: %i, residual: %f" % (repeated.iterations, repeated.residual))
 
 start_time = time.time()
 repeated2.calculate()
 t = time.time() - start_time
 print("Total time needed for calculation: %f " % t)
+print("Iterations: %i, residual: %f" % (repeated2.iterations, repeated2.residual))
 
 start_time = time.time()
 linsys.calculate()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+import argparse
+import csv
+import time
+from collections import deque
+
+import numpy as np
+
+from LightSkin.Algorithm.ForwardModels.SimpleProportionalForwardModel import SimpleIdealProportionalCalibration
+from LightSkin.Algorithm.ForwardModels.SyntheticForwardModel import SyntheticForwardModel
+from LightSkin.Algorithm.RayInfluenceModels.DirectSampledRayGridInfluenceModel import DirectSampledRayGridInfluenceModel
+from LightSkin.Algorithm.Reconstruction.LogarithmicLinSysOptimize2 import LogarithmicLinSysOptimize2
+from LightSkin.Algorithm.Reconstruction.RegularizedLinearReconstruction import RegularizedLinearReconstruction
+from LightSkin.Algorithm.RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
+from LightSkin.Helpers.DiskCache import DiskCache
+from LightSkin.Helpers.FrameMailbox import LatestFrameWorker
+from LightSkin.LightSkin import LightSkin, ValueMap
+
+
+# Source: https://code.activestate.com/recipes/410687-transposing-a-list-of-lists-with-different-lengths/
+def transposed(lists):
+    if not lists:
+        return []
+    return list(map(lambda *row: list(row), *lists))
+
+
+parser = argparse.ArgumentParser(description='Runs the reconstruction on synthetic frames and reports the throughput')
+parser.add_argument('--rate', type=float, default=100.0, help='frames per second emitted by the source')
+parser.add_argument('--noise', type=float, default=0.01, help='standard deviation of the sensor noise')
+parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+parser.add_argument('--resolution', type=int, default=8, help='size of the reconstruction grid')
+parser.add_argument('--model', choices=('nnls', 'linear'), default='nnls',
+                    help='reconstruction: nonnegative least squares (LogarithmicLinSysOptimize2) '
+                         'or the precomputed RegularizedLinearReconstruction')
+parser.add_argument('--max-time', type=float, default=None,
+                    help='time budget of the solver per frame in seconds; the best solution reached is used')
+parser.add_argument('--worker', action='store_true',
+                    help='reconstruct in a separate thread, always using the newest frame (like visualizer.py)')
+args = parser.parse_args()
+
+# Main Code
+
+InfluenceMatrix.diskCache = DiskCache('cache')
+RegularizedLinearReconstruction.diskCache = DiskCache('cache')
+
+ls = LightSkin()
+
+# LOAD Sensor and LED coordinates from CSV
+
+with open('sensors.csv', 'r') as csvfile:
+    read = csv.reader(csvfile)
+    for r in read:
+        s = (float(r[0]), float(r[1]))
+        ls.sensors.append(s)
+#
+with open('leds.csv', 'r') as csvfile:
+    read = csv.reader(csvfile)
+    for r in read:
+        s = (float(r[0]), float(r[1]))
+        ls.LEDs.append(s)
+
+gridVals = []
+with open('translucency.csv', 'r') as csvfile:
+    read = csv.reader(csvfile)
+    for r in read:
+        vals = list(map(float, r))
+        gridVals.append(vals)
+
+ls.translucencyMap = ValueMap(ls.getGridArea(), grid=transposed(gridVals))
+
+source = SyntheticForwardModel(ls, DirectSampledRayGridInfluenceModel(),
+                               rate=args.rate, noise=args.noise, autostart=False)
+backwardModelClass = RegularizedLinearReconstruction if args.model == 'linear' else LogarithmicLinSysOptimize2
+backwardModel = backwardModelClass(ls,
+                                   args.resolution, args.resolution,
+                                   SimpleIdealProportionalCalibration(ls),
+                                   DirectSampledRayGridInfluenceModel())
+backwardModel.maxTime = args.max_time
+backwardModel.verbose = False
+ls.forwardModel = source
+ls.backwardModel = backwardModel
+
+latencies = []
+unconverged = 0
+frameTimes = deque()
+""" (sequence number, emission time) of the frames not handled yet, in order """
+
+
+def onEmit():
+    frameTimes.append((source.frames.latestSequence, source.frameTime))
+
+
+def onFrame(frame):
+    global unconverged
+    backwardModel.calculateFrame(frame)
+    if not backwardModel.converged:
+        unconverged += 1
+    sequence = worker.frameSequence if worker is not None else source.frames.latestSequence
+    # frames before this one were dropped
+    while frameTimes[0][0] < sequence:
+        frameTimes.popleft()
+    latencies.append(time.perf_counter() - frameTimes.popleft()[1])
+
+
+source.onUpdate += onEmit
+worker = None
+if args.worker:
+    worker = LatestFrameWorker(source, onFrame)
+else:
+    source.onUpdate += lambda: onFrame(source.getAllSensorValues())
+
+start = time.perf_counter()
+source.start()
+time.sleep(args.duration)
+source.stop()
+if worker is not None:
+    worker.stop()
+elapsed = time.perf_counter() - start
+
+lat = np.array(latencies) * 1000
+print("Requested rate:   %.1f frames/s" % args.rate)
+print("Sustained rate:   %.1f frames/s (%i frames, %i late)" % (len(lat) / elapsed, len(lat), source.lateFrames))
+if worker is not None:
+    print("Dropped frames:   %i" % worker.droppedFrames)
+print("Not converged:    %i" % unconverged)
+if len(lat) > 0:
+    print("Latency:          mean %.3f ms / p50 %.3f ms / p99 %.3f ms / max %.3f ms" % (
+        lat.mean(), np.percentile(lat, 50), np.percentile(lat, 99), lat.max()))
@@ -0,0 +1,61 @@
+import math
+import unittest
+
+import numpy as np
+
+from LightSkin.Algorithm.ForwardModels.SimpleProportionalForwardModel import SimpleProportionalForwardModel, \
+    SimpleIdealProportionalCalibration
+from LightSkin.Algorithm.RayInfluenceModels.DirectSampledRayGridInfluenceModel import \
+    DirectSampledRayGridInfluenceModel
+from LightSkin.Algorithm.Reconstruction.SimpleRepeatedLogarithmicBackProjection import \
+    SimpleRepeatedLogarithmicBackProjection
+from LightSkin.Helpers.ValueMap import ValueMap
+from LightSkin.LightSkin import LightSkin
+
+
+def makeSkin() -> LightSkin:
+    """ 12 LEDs and 12 sensors alternating on a circle, with a less translucent spot in the middle """
+    ls = LightSkin()
+    for k in range(12):
+        a = 2 * math.pi * k / 12
+        ls.LEDs.append((7.5 * math.sin(a), 7.5 * math.cos(a)))
+        a += math.pi / 12
+        ls.sensors.append((7.5 * math.sin(a), 7.5 * math.cos(a)))
+    ls.translucencyMap = ValueMap(ls.getGridArea(), 10, 10)
+    for i in range(10):
+        for j in range(10):
+            ls.translucencyMap.grid[i][j] = 0.5 if 3 <= i <= 6 and 3 <= j <= 6 else 1.0
+    return ls
+
+
+class SimpleRepeatedLogarithmicBackProjectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ls = makeSkin()
+        self.frame = SimpleProportionalForwardModel(self.ls, DirectSampledRayGridInfluenceModel()).getAllSensorValues()
+        self.zeroFrame = self.frame.copy()
+        self.zeroFrame[0, 5] = 0.0
+
+    def makeModel(self, **kwargs) -> SimpleRepeatedLogarithmicBackProjection:
+        return SimpleRepeatedLogarithmicBackProjection(self.ls, 8, 8, SimpleIdealProportionalCalibration(self.ls),
+                                                       DirectSampledRayGridInfluenceModel(), **kwargs)
+
+    def test_zero_reading(self):
+        model = self.makeModel()
+        grids = model.reconstructBatch(self.zeroFrame[np.newaxis])
+        self.assertTrue(np.isfinite(grids).all())
+        self.assertTrue(np.isfinite(model.residual))
+        self.assertTrue(((grids >= 0.0) & (grids <= 1.0)).all())
+
+    def test_warm_start_after_zero_reading(self):
+        model = self.makeModel(warm_start=True)
+        model.reconstructBatch(self.zeroFrame[np.newaxis])
+        grids = model.reconstructBatch(self.frame[np.newaxis])
+        self.assertTrue(np.isfinite(grids).all())
+
+        expected = self.makeModel().reconstructBatch(self.frame[np.newaxis])
+        self.assertLess(np.abs(grids - expected).max(), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
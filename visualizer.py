@@ -6,12 +6,16 @@ import tkinter as tk
 
 from LightSkin.Algorithm.RayInfluenceModels.DirectSampledRayGridInfluenceModel import DirectSampledRayGridInfluenceModel
 from LightSkin.Algorithm.Reconstruction.LogarithmicLinSysOptimize2 import LogarithmicLinSysOptimize2
+from LightSkin.Algorithm.Reconstruction.ChangeGate import ChangeGate
+from LightSkin.Algorithm.RayInfluenceModels.InfluenceMatrix import InfluenceMatrix
+from LightSkin.Helpers.DiskCache import DiskCache
+from LightSkin.Helpers.FrameMailbox import LatestFrameWorker
 from LightSkin.LightSkin import LightSkin
 from LightSkin.GUI import Views
 
 # from SimpleProportionalForwardModel import SimpleProportionalForwardModel
 from LightSkin.Algorithm.ForwardModels.ArduinoConnectorForwardModel import ArduinoConnectorForwardModel
-from LightSkin.Algorithm.SimpleCalibration import SimpleCalibration
+from LightSkin.Algorithm.AdaptiveCalibration import AdaptiveCalibration
 import serial.tools.list_ports
 
 
@@ -24,6 +28,8 @@ def transposed(lists):
 
 # Main Code
 
+InfluenceMatrix.diskCache = DiskCache('cache')
+
 ports = list(serial.tools.list_ports.comports())
 port = None
 for p in ports:
@@ -56,17 +62,23 @@ with open('leds.csv', 'r') as csvfile:
         ls.LEDs.append(s)
 
 recResolution = 8
+reconstructionTime = 0.01
+""" Time budget of the solver per frame in seconds; leaves room for the display to update at 60 Hz """
 
-calibration = SimpleCalibration(ls)
+calibration = AdaptiveCalibration(ls, frames=10)
 
 arduinoConnector = ArduinoConnectorForwardModel(ls, port[0], 1000000)
 backwardModel = LogarithmicLinSysOptimize2(ls,
                                            recResolution, recResolution,
                                            calibration,
-                                           DirectSampledRayGridInfluenceModel())
+                                           DirectSampledRayGridInfluenceModel(),
+                                           max_time=reconstructionTime)
+
+# only reconstruct frames that changed, and only where they changed
+changeGate = ChangeGate(backwardModel)
 
 ls.forwardModel = arduinoConnector
-ls.backwardModel = backwardModel
+ls.backwardModel = changeGate
 
 # print(ls.sensors)
 # print(ls.LEDs)
@@ -92,14 +104,25 @@ topViewReconstructed = Views.LightSkinTopView(window, ls, highlightbackground='#
 topViewReconstructed.pack(side=tk.RIGHT)
 
 
-def onUpdate():
+droppedFrames = 0
+
+
+def onFrame(frame):
+    global droppedFrames
+    # calibrates with the first frames, then follows the drift of unloaded rays
+    calibration.update(frame)
     if not calibration.isCalibrated:
-        calibration.calibrate()
-    backwardModel.calculate()
+        return
+    if not changeGate.calculateFrame(frame):
+        return  # nothing changed; no need to refresh the views
     ls.onChange('values')
+    if reconstructionWorker.droppedFrames != droppedFrames:
+        droppedFrames = reconstructionWorker.droppedFrames
+        print("Frames dropped because the reconstruction was too slow: %i" % droppedFrames)
 
 
-arduinoConnector.onUpdate += onUpdate
+# reconstruct in a separate thread, so reading from the serial port is never blocked
+reconstructionWorker = LatestFrameWorker(arduinoConnector, onFrame)
 
 window.mainloop()
 